@@ -0,0 +1,246 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+import numpy as np
+
+from app.logger import LogManager
+
+AUDIENCE_LABELS = [
+    "young female audience (18–30)",
+    "young male audience (18–30)",
+    "adult audience (30–50)",
+    "general audience"
+]
+
+AUDIENCE_DESCRIPTIONS = {
+    "young female audience (18–30)": [
+        "a post for young women",
+        "content aimed at women in their twenties",
+        "fashion, beauty and lifestyle for girls and young women",
+    ],
+    "young male audience (18–30)": [
+        "a post for young men",
+        "content aimed at men in their twenties",
+        "gaming, sports and gym content for guys and young men",
+    ],
+    "adult audience (30–50)": [
+        "a post for adults in their thirties and forties",
+        "content aimed at parents and working professionals",
+        "family, career and home life for grown-ups",
+    ],
+    "general audience": [
+        "a post for everyone",
+        "content suitable for a general audience of all ages",
+        "news and everyday topics for the general public",
+    ],
+}
+
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=-1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+class EmbeddingAudienceClassifier:
+    """Scores captions against fixed audience labels with a sentence encoder instead of NLI."""
+
+    def __init__(self, models, head_path=None):
+
+        log_manager = LogManager('audienceClassifier')
+        self.logger = log_manager.get_logger()
+
+        self.models = models
+        self.labels = AUDIENCE_LABELS
+        self.temperature = float(os.getenv("AUDIENCE_TEMPERATURE", "30"))
+        self.head_path = head_path if head_path is not None else os.getenv(
+            "AUDIENCE_HEAD_PATH",
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "audience_head.npz")
+        )
+
+        self._weights = None
+        self._bias = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        if self.head_path and os.path.exists(self.head_path):
+            return f"head:{self.head_path}:{os.path.getmtime(self.head_path)}"
+        return f"prototypes:{self.temperature}"
+
+    def embed(self, texts):
+        import torch
+
+        tokenizer, model = self.models.sentence_encoder()
+        inputs = tokenizer(texts, return_tensors="pt", padding=True, truncation=True, max_length=128).to(self.models.device)
+        with torch.inference_mode():
+            hidden = model(**inputs).last_hidden_state
+
+        mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        embeddings = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+        embeddings = embeddings / embeddings.norm(dim=-1, keepdim=True).clamp(min=1e-12)
+        return embeddings.float().cpu().numpy()
+
+    def prototypes(self):
+        prototypes = np.stack([self.embed(AUDIENCE_DESCRIPTIONS[label]).mean(axis=0) for label in self.labels])
+        return prototypes / np.linalg.norm(prototypes, axis=-1, keepdims=True)
+
+    def _load(self):
+        if self._weights is not None:
+            return
+
+        with self._lock:
+            if self._weights is not None:
+                return
+
+            if self.head_path and os.path.exists(self.head_path):
+                head = np.load(self.head_path)
+                if list(head["labels"]) != self.labels:
+                    raise ValueError(f"Audience head at {self.head_path} was trained for different labels.")
+                self._bias = head["bias"].astype(np.float32)
+                self._weights = head["weights"].astype(np.float32)
+                self.logger.info(f"Loaded distilled audience head from {self.head_path}.")
+            else:
+                self._bias = np.zeros(len(self.labels), dtype=np.float32)
+                self._weights = (self.prototypes() * self.temperature).astype(np.float32)
+                self.logger.info("Using audience label prototypes (no distilled head found).")
+
+    def probabilities(self, embeddings):
+        self._load()
+        return _softmax(embeddings @ self._weights.T + self._bias)
+
+    def __call__(self, texts):
+        if not texts:
+            return []
+
+        probabilities = self.probabilities(self.embed(texts))
+        results = []
+        for text, scores in zip(texts, probabilities):
+            order = np.argsort(-scores)
+            results.append({
+                "sequence": text,
+                "labels": [self.labels[i] for i in order],
+                "scores": [float(scores[i]) for i in order],
+            })
+        return results
+
+
+def fit_head(embeddings, targets, initial_weights, epochs=300, learning_rate=0.5, l2=1e-4, sample_weight=None):
+    weights = initial_weights.astype(np.float64).copy()
+    bias = np.zeros(targets.shape[1])
+    sample_weight = np.ones(len(embeddings)) if sample_weight is None else sample_weight / sample_weight.mean()
+
+    for _ in range(epochs):
+        gradient = (_softmax(embeddings @ weights.T + bias) - targets) * sample_weight[:, None]
+        weights -= learning_rate * (gradient.T @ embeddings / len(embeddings) + l2 * weights)
+        bias -= learning_rate * gradient.mean(axis=0)
+
+    return weights.astype(np.float32), bias.astype(np.float32)
+
+
+def _agreement(teacher, student):
+    return {
+        "top1_agreement": round(float((teacher.argmax(axis=1) == student.argmax(axis=1)).mean()), 4),
+        "mean_abs_score_diff": round(float(np.abs(teacher - student).mean()), 4),
+    }
+
+
+def audience_targets(zero_shot, batch):
+    """Zero-shot audience probabilities, one row per caption in AUDIENCE_LABELS order."""
+    outputs = zero_shot(batch, candidate_labels=AUDIENCE_LABELS, batch_size=len(batch) * len(AUDIENCE_LABELS))
+    outputs = outputs if isinstance(outputs, list) else [outputs]
+    return [[dict(zip(o["labels"], o["scores"]))[label] for label in AUDIENCE_LABELS] for o in outputs]
+
+
+def holdout_split(count, holdout):
+    """Returns (train, test) indexes; a single caption is used for both."""
+    order = np.random.default_rng(0).permutation(count)
+    held_out = max(1, int(count * holdout)) if count > 1 else 0
+    test, train = order[:held_out], order[held_out:]
+    return train, test if held_out else train
+
+
+def save_head(out_path, **arrays):
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    np.savez(out_path, **arrays)
+
+
+def calibrate(captions, out_path, holdout=0.2, batch_size=32):
+    from app.model_registry import model_registry
+
+    classifier = EmbeddingAudienceClassifier(model_registry, head_path="")
+    zero_shot = model_registry.zero_shot_classifier()
+
+    teacher, embeddings = [], []
+    teacher_seconds = student_seconds = 0.0
+    for start in range(0, len(captions), batch_size):
+        batch = captions[start:start + batch_size]
+
+        started = time.perf_counter()
+        teacher.extend(audience_targets(zero_shot, batch))
+        teacher_seconds += time.perf_counter() - started
+
+        started = time.perf_counter()
+        embeddings.append(classifier.embed(batch))
+        student_seconds += time.perf_counter() - started
+        print(f"Scored {min(start + batch_size, len(captions))}/{len(captions)} captions", file=sys.stderr)
+
+    teacher = np.asarray(teacher, dtype=np.float32)
+    embeddings = np.concatenate(embeddings)
+
+    train, test = holdout_split(len(captions), holdout)
+
+    prototypes = classifier.prototypes() * classifier.temperature
+    weights, bias = fit_head(embeddings[train], teacher[train], prototypes)
+
+    report = {
+        "captions": len(captions),
+        "holdout": len(test),
+        "zero_shot_ms_per_caption": round(1000 * teacher_seconds / len(captions), 2),
+        "embedding_ms_per_caption": round(1000 * student_seconds / len(captions), 2),
+        "prototypes": _agreement(teacher[test], _softmax(embeddings[test] @ prototypes.T)),
+        "distilled_head": _agreement(teacher[test], _softmax(embeddings[test] @ weights.T + bias)),
+    }
+
+    if out_path:
+        save_head(out_path, weights=weights, bias=bias, labels=np.asarray(AUDIENCE_LABELS))
+        report["head_path"] = out_path
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return report
+
+
+def distillation_main(argv, description, head_variable, default_head_path, run):
+    """Command line shared by the distillation scripts; `run(captions, out_path, holdout, batch_size)` does the work."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("captions", help="Text file with one caption per line.")
+    parser.add_argument("--out", default=None, help=f"Where to write the trained head (defaults to {head_variable}).")
+    parser.add_argument("--no-save", action="store_true", help="Only report agreement, do not write the head.")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Fraction of captions kept for evaluation.")
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args(argv)
+
+    with open(args.captions, encoding="utf-8") as f:
+        captions = list(dict.fromkeys(line.strip() for line in f if line.strip()))
+    if not captions:
+        parser.error("no captions found")
+
+    out_path = None if args.no_save else (args.out or default_head_path)
+    return run(captions, out_path, holdout=args.holdout, batch_size=args.batch_size)
+
+
+def main(argv=None):
+    distillation_main(
+        argv,
+        "Distill the zero-shot audience classifier into a head on sentence embeddings "
+        "and report its agreement with zero-shot-classification.",
+        "AUDIENCE_HEAD_PATH", EmbeddingAudienceClassifier(None).head_path, calibrate
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from app.logger import LogManager
+from app.metrics import BATCH_SIZE, MODEL_FORWARD_SECONDS, current_profile, record
+
+batchers = {}
+
+
+class MicroBatcher:
+    def __init__(self, name, handler, max_batch_size=None, max_wait_ms=None):
+
+        log_manager = LogManager('batching')
+        self.logger = log_manager.get_logger()
+
+        self.name = name
+        self.handler = handler
+        self.max_batch_size = max_batch_size or int(os.getenv("BATCH_MAX_SIZE", "16"))
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else float(os.getenv("BATCH_MAX_WAIT_MS", "5"))) / 1000.0
+
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._requests = 0
+        self._max_batch_seen = 0
+        self._batch_size_counts = {}
+
+        batchers[name] = self
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=f"batcher-{self.name}", daemon=True)
+                self._worker.start()
+
+    def submit(self, items):
+        items = list(items)
+        if not items:
+            return []
+
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((items, future, current_profile()))
+        return future.result()
+
+    def _collect(self):
+        pending = [self._queue.get()]
+        size = len(pending[0][0])
+        deadline = time.monotonic() + self.max_wait
+
+        while size < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            pending.append(request)
+            size += len(request[0])
+
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            batch = [item for items, _, _ in pending for item in items]
+
+            started = time.perf_counter()
+            try:
+                results = self.handler(batch)
+            except Exception as e:
+                if len(batch) == 1:
+                    self.logger.error(f"Batch of 1 item failed in {self.name}: {e}", exc_info=True)
+                    pending[0][1].set_exception(e)
+                else:
+                    self.logger.warning(f"Batch of {len(batch)} items failed in {self.name}: {e}; retrying them one by one.")
+                    self._run_one_by_one(pending)
+                continue
+            finally:
+                self._record(pending, len(batch), time.perf_counter() - started)
+
+            offset = 0
+            for items, future, _ in pending:
+                future.set_result(results[offset:offset + len(items)])
+                offset += len(items)
+
+    def _run_one_by_one(self, pending):
+        # Only the requests holding an input that fails on its own get the exception.
+        for items, future, _ in pending:
+            try:
+                future.set_result([self.handler([item])[0] for item in items])
+            except Exception as e:
+                self.logger.error(f"Item failed in {self.name}: {e}", exc_info=True)
+                future.set_exception(e)
+
+    def _record(self, pending, items, elapsed):
+        MODEL_FORWARD_SECONDS.labels(self.name).observe(elapsed)
+        BATCH_SIZE.labels(self.name).observe(items)
+        for _, _, profile in pending:
+            record(f"{self.name}.forward", elapsed, profile)
+
+        with self._stats_lock:
+            self._batches += 1
+            self._requests += len(pending)
+            self._items += items
+            self._max_batch_seen = max(self._max_batch_seen, items)
+            self._batch_size_counts[items] = self._batch_size_counts.get(items, 0) + 1
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "requests": self._requests,
+                "items": self._items,
+                "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "max_batch_size_seen": self._max_batch_seen,
+                "batch_size_counts": dict(sorted(self._batch_size_counts.items())),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+            }
+
+
+def batching_stats():
+    return {name: batcher.stats() for name, batcher in batchers.items()}
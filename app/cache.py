@@ -0,0 +1,233 @@
+import os
+import json
+import queue
+import pickle
+import sqlite3
+import hashlib
+import asyncio
+import threading
+from collections import OrderedDict
+
+from app.logger import LogManager
+
+
+def content_hash(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (bytes, bytearray)):
+            digest.update(part)
+        else:
+            digest.update(json.dumps(part, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class LRUCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, size):
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous[1]
+
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache:
+    def __init__(self, path):
+
+        log_manager = LogManager('cache')
+        self.logger = log_manager.get_logger()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._inherited = []
+        self._connect()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reconnect)
+
+    def _reconnect(self):
+        # A connection must not cross fork(); the parent's one is kept open (never used) so
+        # closing it here cannot touch the parent's locks.
+        self._inherited.append(self._conn)
+        self._connect()
+
+    def _connect(self):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        self._conn.commit()
+        # Writes are committed by one background thread, so callers never wait on the disk;
+        # queued payloads are still served by get() until they land.
+        self._pending = {}
+        self._writes = queue.Queue()
+        self._writer = None
+
+    def get(self, namespace, key):
+        with self._lock:
+            payload = self._pending.get((namespace, key))
+            if payload is not None:
+                return payload
+            row = self._conn.execute(
+                "SELECT value FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, namespace, key, payload):
+        with self._lock:
+            self._pending[(namespace, key)] = payload
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="cache-writer", daemon=True)
+                self._writer.start()
+        self._writes.put((namespace, key))
+
+    def flush(self):
+        self._writes.join()
+
+    def _write_loop(self):
+        while True:
+            keys = [self._writes.get()]
+            while True:
+                try:
+                    keys.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+
+            with self._lock:
+                rows = [(namespace, key, self._pending[(namespace, key)]) for namespace, key in dict.fromkeys(keys)
+                        if (namespace, key) in self._pending]
+                try:
+                    self._conn.executemany("INSERT OR REPLACE INTO cache (namespace, key, value) VALUES (?, ?, ?)", rows)
+                    self._conn.commit()
+                except sqlite3.Error as e:
+                    self.logger.error(f"Disk cache write failed: {e}")
+                for namespace, key, payload in rows:
+                    if self._pending.get((namespace, key)) is payload:
+                        del self._pending[(namespace, key)]
+
+            for _ in keys:
+                self._writes.task_done()
+
+
+class FeatureCache:
+    def __init__(self, max_bytes=None, db_path=None):
+
+        log_manager = LogManager('cache')
+        self.logger = log_manager.get_logger()
+
+        self.enabled = os.getenv("CACHE_ENABLED", "1") != "0"
+        self.memory = LRUCache(max_bytes or int(os.getenv("CACHE_MAX_BYTES", str(256 * 1024 * 1024))))
+
+        db_path = db_path or os.getenv("CACHE_DB_PATH", "")
+        self.disk = SQLiteCache(db_path) if db_path and self.enabled else None
+
+        self._stats_lock = threading.Lock()
+        self._counters = {}
+
+    def _count(self, namespace, name):
+        with self._stats_lock:
+            counters = self._counters.setdefault(namespace, {"memory_hits": 0, "disk_hits": 0, "misses": 0})
+            counters[name] += 1
+
+    def _get_memory(self, namespace, key):
+        value = self.memory.get((namespace, key))
+        if value is not None:
+            self._count(namespace, "memory_hits")
+        return value
+
+    def _get_disk(self, namespace, key):
+        if self.disk is not None:
+            try:
+                payload = self.disk.get(namespace, key)
+            except sqlite3.Error as e:
+                self.logger.error(f"Disk cache read failed: {e}")
+                payload = None
+            if payload is not None:
+                value = pickle.loads(payload)
+                self.memory.set((namespace, key), value, len(payload))
+                self._count(namespace, "disk_hits")
+                return value
+
+        self._count(namespace, "misses")
+        return None
+
+    def get(self, namespace, key):
+        if not self.enabled:
+            return None
+
+        value = self._get_memory(namespace, key)
+        return value if value is not None else self._get_disk(namespace, key)
+
+    async def get_async(self, namespace, key, run_blocking=asyncio.to_thread):
+        """get() for the event loop: the in-memory tier is checked inline, SQLite reads go through run_blocking."""
+        if not self.enabled:
+            return None
+
+        value = self._get_memory(namespace, key)
+        if value is not None:
+            return value
+        if self.disk is None:
+            return self._get_disk(namespace, key)
+        return await run_blocking(self._get_disk, namespace, key)
+
+    def set(self, namespace, key, value):
+        if not self.enabled or value is None:
+            return
+
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self.memory.set((namespace, key), value, len(payload))
+
+        if self.disk is not None:
+            self.disk.set(namespace, key, payload)
+
+    def flush(self):
+        if self.disk is not None:
+            self.disk.flush()
+
+    def stats(self):
+        with self._stats_lock:
+            namespaces = {namespace: dict(counters) for namespace, counters in self._counters.items()}
+
+        return {
+            "enabled": self.enabled,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.current_bytes,
+            "memory_max_bytes": self.memory.max_bytes,
+            "memory_evictions": self.memory.evictions,
+            "disk_enabled": self.disk is not None,
+            "namespaces": namespaces,
+        }
+
+
+feature_cache = FeatureCache()
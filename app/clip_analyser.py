@@ -1,62 +1,124 @@
-import os
 import re
-import torch
-from transformers import pipeline
-from transformers import CLIPProcessor, CLIPModel
+import logging
+import numpy as np
 from collections import defaultdict
 
+from app.batching import MicroBatcher
+from app.hashtag_index import HashtagEmbeddingIndex
 from app.logger import LogManager
+from app.metrics import stage
 
 
 class ClipAnalyzer:
-    def __init__(self, post_text_list, image_path, labels_hashtag_list):
+    def __init__(self, models):
 
         log_manager = LogManager('ClipAnalyzer')
         self.logger = log_manager.get_logger()
 
-        clip_model = os.getenv("KEYPHRASE_MODEL", "openai/clip-vit-base-patch32")
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.device = device
-        labels_hashtag = " ".join(labels_hashtag_list)
-        self.labels_hashtag = re.findall(r"#\w+", labels_hashtag)
-
-        self.post_text_list = post_text_list
-        self.image_path = image_path
-        self.model_clip = pipeline(
-            task="zero-shot-image-classification",
-            model=clip_model,
-            dtype=torch.bfloat16,
-            device=0
-            )
-        self.model_clip_pre_trained = CLIPModel.from_pretrained(clip_model)
-        self.model_clip_pre_trained = self.model_clip_pre_trained.to(device)
-        self.model_clip_processor = CLIPProcessor.from_pretrained(clip_model)
-    
-    def labels_analyse(self):
-        return self.model_clip(self.image_path, candidate_labels=self.post_text_list)
-    
-    def hashtag_analyse(self):        
-        return self.model_clip(self.image_path, candidate_labels=self.labels_hashtag)
-    
-    def embeddings_text_image(self, text_list):
-        inputs = self.model_clip_processor(text=text_list, images=[self.image_path], return_tensors="pt", padding=True).to(self.device)
-        with torch.no_grad():
-            img_emb = self.model_clip_pre_trained.get_image_features(**inputs)
-            txt_emb = self.model_clip_pre_trained.get_text_features(**inputs)
-        img_emb = img_emb / img_emb.norm(dim=-1, keepdim=True)
-        txt_emb = txt_emb / txt_emb.norm(dim=-1, keepdim=True)
-
-        cosine = (txt_emb @ img_emb.T).squeeze()
+        self.models = models
+        self.batcher = MicroBatcher("clip", self.encode_batch)
+        self.hashtag_index = HashtagEmbeddingIndex()
+
+    def open_hashtag_index(self):
+        model_clip, _ = self.models.clip_model()
+        self.hashtag_index.open(self.models.model_names()["clip"], model_clip.config.projection_dim)
+
+    def encode_batch(self, items):
+        import torch
+
+        model_clip, model_clip_processor = self.models.clip_model()
+        self.open_hashtag_index()
+
+        # Hashtag embeddings come from the persistent index; only unseen tags reach the text tower.
+        hashtag_embeddings, new_hashtags = self.hashtag_index.lookup(
+            [tag for _, hashtags, _ in items for tag in hashtags]
+        )
+        sequences = [text for _, _, sequence_list in items for text in sequence_list]
+        texts = new_hashtags + sequences
+
+        # Carousel images and video keyframes of every post go through the image tower together.
+        to_encode = list({
+            id(frame): frame for image, _, _ in items for frame in image.frames if frame.clip_embedding is None
+        }.values())
+
+        if to_encode:
+            pixel_values = model_clip_processor(images=[frame.pixels for frame in to_encode], return_tensors="pt")["pixel_values"].to(self.models.device)
+        with torch.inference_mode():
+            if to_encode:
+                new_img_emb = model_clip.get_image_features(pixel_values=pixel_values)
+                new_img_emb = new_img_emb / new_img_emb.norm(dim=-1, keepdim=True)
+                for row, frame in enumerate(to_encode):
+                    frame.clip_embedding = new_img_emb[row].float().cpu().numpy()
+            logit_scale = model_clip.logit_scale.exp().float().cpu()
+
+        txt_emb = torch.from_numpy(self.encode_texts(texts))
+
+        if new_hashtags:
+            new_hashtag_emb = txt_emb[:len(new_hashtags)].numpy()
+            self.hashtag_index.add(new_hashtags, new_hashtag_emb)
+            hashtag_embeddings.update(zip(new_hashtags, new_hashtag_emb))
+            self.logger.info(f"Added {len(new_hashtags)} new hashtags to the embedding index.")
+        sequence_emb = txt_emb[len(new_hashtags):]
+
+        results = []
+        offset = 0
+        for image, hashtags, sequence_list in items:
+            img_emb = torch.from_numpy(image.clip_embedding)
+            if hashtags:
+                hashtag_emb = torch.from_numpy(np.stack([hashtag_embeddings[tag] for tag in hashtags]))
+            else:
+                hashtag_emb = torch.zeros((0, img_emb.shape[-1]))
+            results.append((img_emb, hashtag_emb, sequence_emb[offset:offset + len(sequence_list)], logit_scale))
+            offset += len(sequence_list)
+
+        return results
+
+    def encode_texts(self, texts):
+        import torch
+
+        model_clip, model_clip_processor = self.models.clip_model()
+        if not texts:
+            return np.zeros((0, model_clip.config.projection_dim), dtype=np.float32)
+
+        text_inputs = model_clip_processor(text=texts, return_tensors="pt", padding=True, truncation=True).to(self.models.device)
+        with torch.inference_mode():
+            txt_emb = model_clip.get_text_features(input_ids=text_inputs["input_ids"], attention_mask=text_inputs["attention_mask"])
+            txt_emb = txt_emb / txt_emb.norm(dim=-1, keepdim=True)
+
+        return txt_emb.float().cpu().numpy()
+
+    def encode(self, image, labels_hashtag, post_text_list):
+        return self.batcher.submit([(image, labels_hashtag, post_text_list)])[0]
+
+    def image_embedding(self, image):
+        if image.clip_embedding is None:
+            self.encode(image, [], [])
+        return image.clip_embedding
+
+    def hashtag_embeddings(self, hashtags):
+        self.open_hashtag_index()
+        embeddings, missing = self.hashtag_index.lookup(hashtags)
+        if missing:
+            missing_emb = self.encode_texts(missing)
+            self.hashtag_index.add(missing, missing_emb)
+            embeddings.update(zip(missing, missing_emb))
+        return np.stack([embeddings[tag] for tag in hashtags])
+
+    def zero_shot_scores(self, cosine, logit_scale, text_list):
+        if not text_list:
+            return []
+
+        probs = (logit_scale * cosine).softmax(dim=-1).tolist()
+        scores = [{"label": label, "score": prob} for label, prob in zip(text_list, probs)]
+        scores.sort(key=lambda x: x["score"], reverse=True)
+        return scores
+
+    def similarity_metrics(self, cosine, text_list):
         sim01  = (cosine + 1) / 2
 
         cosine_list = cosine.tolist()
         sim_list = sim01.tolist()
         
-        if type(cosine_list) == float:
-            cosine_list = [cosine_list]
-        if type(sim_list) == float:
-            sim_list = [sim_list]
-        
         results = []
         for i, (cos, sim) in enumerate(zip(cosine_list, sim_list)):
             sequence = text_list[i]
@@ -78,25 +140,67 @@ class ClipAnalyzer:
 
         return results
         
-    def analyser(self):
-        self.logger.info("🚀 Starting CLIP analysis pipeline...")
+    def analyser(self, post_text_list, image, labels_hashtag_list):
+        return self.analyser_batch([(post_text_list, image, labels_hashtag_list)])[0]
+
+    def analyser_batch(self, items):
+        self.logger.info(f"🚀 Starting CLIP analysis pipeline for {len(items)} post(s)...")
+
+        labels_hashtag_per_item = [
+            re.findall(r"#\w+", " ".join(labels_hashtag_list))
+            for _, _, labels_hashtag_list in items
+        ]
 
         try:
-            self.logger.info("Step : Running hashtag analysis...")
-            hashtags_scores = self.hashtag_analyse()
-            self.logger.info(f"Hashtag analysis completed. Found {len(hashtags_scores) if hashtags_scores else 0} items.")
+            self.logger.info("Step 1: Encoding images, hashtags and text sequences in one CLIP pass...")
+            with stage("clip.encode"):
+                encoded = self.batcher.submit([
+                    (image, labels_hashtag, post_text_list)
+                    for (post_text_list, image, _), labels_hashtag in zip(items, labels_hashtag_per_item)
+                ])
+            self.logger.info(f"CLIP embeddings computed for {len(encoded)} post(s).")
+        except Exception as e:
+            self.logger.error(f"Error during CLIP encoding: {e}", exc_info=True)
+            raise
 
-            self.logger.info("Step 2: Running label (sequence) analysis...")
-            sequences_scores = self.labels_analyse()
-            self.logger.info(f"Sequence analysis completed. Found {len(sequences_scores) if sequences_scores else 0} items.")
+        with stage("clip.scoring"):
+            results = []
+            for (post_text_list, image, _), labels_hashtag, encoded_item in zip(items, labels_hashtag_per_item, encoded):
+                result = self.build_result(post_text_list, labels_hashtag, *encoded_item)
+                if len(image.frames) > 1:
+                    result["clip_analysis"]["frame_analysis"] = self.frame_alignment(
+                        image, post_text_list, encoded_item[2], result["clip_analysis"]["sequence_analysis"]["text"]
+                    )
+                results.append(result)
+            return results
+
+    def frame_alignment(self, image, post_text_list, sequence_emb, text):
+        # The post-level scores use the weighted mean over frames; this shows how each frame matches the best sequence.
+        import torch
+
+        if text not in post_text_list:
+            return []
+        frame_emb = torch.from_numpy(np.stack([frame.clip_embedding for frame in image.frames]))
+        cosine = frame_emb @ sequence_emb[post_text_list.index(text)]
+        return [
+            {**info, **{key: value for key, value in metrics.items() if key != "label"}}
+            for info, metrics in zip(image.frame_info, self.similarity_metrics(cosine, [text] * len(image.frames)))
+        ]
+
+    def build_result(self, post_text_list, labels_hashtag, img_emb, hashtag_emb, sequence_emb, logit_scale):
+        try:
+            hashtag_cosine = hashtag_emb @ img_emb
+            sequence_cosine = sequence_emb @ img_emb
 
-            self.logger.info("Step 3: Computing CLIP embeddings for hashtags...")
-            clip_hashtag_metrics = self.embeddings_text_image(self.labels_hashtag)
-            self.logger.info(f"CLIP embeddings for hashtags computed. Count: {len(clip_hashtag_metrics)}")
+            self.logger.info("Step 2: Scoring hashtags...")
+            hashtags_scores = self.zero_shot_scores(hashtag_cosine, logit_scale, labels_hashtag)
+            clip_hashtag_metrics = self.similarity_metrics(hashtag_cosine, labels_hashtag)
+            self.logger.info(f"Hashtag analysis completed. Found {len(hashtags_scores)} items.")
 
-            self.logger.info("Step 4: Computing CLIP embeddings for text sequences...")
-            clip_sequence_metrics = self.embeddings_text_image(self.post_text_list)
-            self.logger.info(f"CLIP embeddings for sequences computed. Count: {len(clip_sequence_metrics)}")
+            self.logger.info("Step 3: Scoring text sequences...")
+            sequences_scores = self.zero_shot_scores(sequence_cosine, logit_scale, post_text_list)
+            clip_sequence_metrics = self.similarity_metrics(sequence_cosine, post_text_list)
+            self.logger.info(f"Sequence analysis completed. Found {len(sequences_scores)} items.")
         except Exception as e:
             self.logger.error(f"Error during initial analysis steps: {e}", exc_info=True)
             raise
@@ -125,7 +229,7 @@ class ClipAnalyzer:
 
             if lab in clip_by_label:
                 merged.update(clip_by_label[lab])
-                self.logger.debug(f"Merged CLIP metrics for hashtag: {lab}")
+                self.logger.debug("Merged CLIP metrics for hashtag: %s", lab)
             else:
                 self.logger.warning(f"No CLIP metrics found for hashtag: {lab}")
 
@@ -172,6 +276,7 @@ class ClipAnalyzer:
         }
 
         self.logger.info("CLIP analysis completed successfully.")
-        self.logger.debug(f"Final result keys: {list(result['clip_analysis'].keys())}")
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Final result keys: %s", list(result['clip_analysis'].keys()))
 
         return result
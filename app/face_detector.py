@@ -0,0 +1,120 @@
+import os
+import threading
+
+import cv2
+
+from app.logger import LogManager
+
+FACE_DETECTOR_BACKENDS = ("haar", "yunet", "ssd")
+
+
+class FaceDetector:
+    def __init__(self, backend=None, max_side=None):
+
+        log_manager = LogManager('faceDetector')
+        self.logger = log_manager.get_logger()
+
+        self.backend = (backend or os.getenv("FACE_DETECTOR", "haar")).lower()
+        if self.backend not in FACE_DETECTOR_BACKENDS:
+            raise ValueError(f"Unknown FACE_DETECTOR '{self.backend}', expected one of {', '.join(FACE_DETECTOR_BACKENDS)}.")
+
+        self.max_side = max_side or int(os.getenv("FACE_DETECTION_MAX_SIDE", "640"))
+        self.confidence = float(os.getenv("FACE_DETECTOR_CONFIDENCE", "0.6"))
+        self.model_path = os.getenv(
+            "FACE_DETECTOR_MODEL",
+            cv2.data.haarcascades + "haarcascade_frontalface_default.xml" if self.backend == "haar" else ""
+        )
+        self.config_path = os.getenv("FACE_DETECTOR_CONFIG", "")
+        if not self.model_path:
+            raise ValueError(f"FACE_DETECTOR_MODEL must point to the {self.backend} model file.")
+
+        # OpenCV detectors keep per-call state, so each worker thread loads its own copy once.
+        self._local = threading.local()
+
+    def _detector(self):
+        detector = getattr(self._local, "detector", None)
+        if detector is None:
+            self.logger.info(f"Loading {self.backend} face detector from {self.model_path}...")
+            if self.backend == "haar":
+                detector = cv2.CascadeClassifier(self.model_path)
+                if detector.empty():
+                    raise ValueError(f"Could not load Haar cascade from {self.model_path}")
+            elif self.backend == "yunet":
+                detector = cv2.FaceDetectorYN.create(self.model_path, "", (320, 320), self.confidence)
+            else:
+                detector = cv2.dnn.readNet(self.model_path, self.config_path)
+            self._local.detector = detector
+        return detector
+
+    def downscale(self, pixels):
+        height, width = pixels.shape[:2]
+        scale = min(1.0, self.max_side / max(height, width))
+        if scale < 1.0:
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            pixels = cv2.resize(pixels, size, interpolation=cv2.INTER_AREA)
+        return pixels, scale
+
+    def _face(self, box, scale, shape):
+        x, y, w, h, score = (float(value) if value is not None else None for value in box)
+        height, width = shape[:2]
+
+        x, y = min(max(0.0, x / scale), width), min(max(0.0, y / scale), height)
+        w, h = max(0.0, min(w / scale, width - x)), max(0.0, min(h / scale, height - y))
+
+        face = {
+            "x": int(round(x)),
+            "y": int(round(y)),
+            "width": int(round(w)),
+            "height": int(round(h)),
+            "relative_area": round(w * h / float(width * height), 4),
+        }
+        if score is not None:
+            face["confidence"] = round(score, 3)
+        return face
+
+    def _detect_one(self, pixels):
+        detector = self._detector()
+        small, scale = self.downscale(pixels)
+
+        if self.backend == "haar":
+            gray = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+            boxes = [(x, y, w, h, None) for x, y, w, h in detector.detectMultiScale(gray, 1.3, 5)]
+        else:
+            detector.setInputSize((small.shape[1], small.shape[0]))
+            _, faces = detector.detect(cv2.cvtColor(small, cv2.COLOR_RGB2BGR))
+            boxes = [(f[0], f[1], f[2], f[3], f[-1]) for f in (faces if faces is not None else [])]
+
+        return [self._face(box, scale, pixels.shape) for box in boxes]
+
+    def _detect_ssd(self, images):
+        net = self._detector()
+        blob = cv2.dnn.blobFromImages(
+            [cv2.cvtColor(self.downscale(pixels)[0], cv2.COLOR_RGB2BGR) for pixels in images],
+            1.0, (300, 300), (104.0, 177.0, 123.0)
+        )
+        net.setInput(blob)
+        detections = net.forward().reshape(-1, 7)
+
+        # SSD boxes are normalized, so they map straight back to full-resolution coordinates.
+        results = [[] for _ in images]
+        for image_id, _, score, x1, y1, x2, y2 in detections:
+            if image_id < 0 or score < self.confidence:
+                continue
+            height, width = images[int(image_id)].shape[:2]
+            box = (x1 * width, y1 * height, (x2 - x1) * width, (y2 - y1) * height, score)
+            results[int(image_id)].append(self._face(box, 1.0, images[int(image_id)].shape))
+        return results
+
+    def detect(self, pixels):
+        return self.detect_batch([pixels])[0]
+
+    def detect_batch(self, images):
+        if not images:
+            return []
+
+        if self.backend == "ssd":
+            results = self._detect_ssd(images)
+        else:
+            results = [self._detect_one(pixels) for pixels in images]
+
+        return [sorted(faces, key=lambda face: face["relative_area"], reverse=True) for faces in results]
@@ -0,0 +1,201 @@
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import threading
+
+import numpy as np
+
+from app.audience_classifier import AUDIENCE_LABELS
+from app.file_lock import file_lock
+from app.final_results import COMPONENTS, resolve_weights, score_batch, tips_batch
+from app.logger import LogManager
+
+# One append-only file per column. "key" is written last, so its length defines the committed rows.
+COLUMNS = {
+    "image_hash": "S32",
+    "created": "f8",
+    "clip_similarity": "f8",
+    "sentiment": "f8",
+    "hashtag_similarity": "f8",
+    "hashtag_count": "i4",
+    "readability": "f8",
+    "faces": "i4",
+    "dimension_quality": "f8",
+    "face_detection_failed": "u1",
+    "width_px": "i4",
+    "height_px": "i4",
+    "size_kb": "f8",
+    "audience_top": "i1",
+    "key": "S32",
+}
+
+
+def _size_kb(size):
+    try:
+        return float(str(size).split()[0])
+    except (ValueError, IndexError):
+        return np.nan
+
+
+class FeatureStore:
+    """Columnar store of the per-post component features that final scores are computed from."""
+
+    def __init__(self, directory=None):
+
+        log_manager = LogManager('featureStore')
+        self.logger = log_manager.get_logger()
+
+        self.directory = directory if directory is not None else os.getenv("FEATURE_STORE_DIR", "")
+        self.enabled = bool(self.directory)
+        self._lock = threading.Lock()
+
+    def _path(self, column):
+        return os.path.join(self.directory, f"{column}.bin")
+
+    def rows(self):
+        path = self._path("key")
+        return os.path.getsize(path) // np.dtype(COLUMNS["key"]).itemsize if os.path.exists(path) else 0
+
+    def _ensure_layout(self):
+        os.makedirs(self.directory, exist_ok=True)
+        meta_path = os.path.join(self.directory, "meta.json")
+        meta = {"columns": COLUMNS, "audience_labels": AUDIENCE_LABELS}
+        if not os.path.exists(meta_path):
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False, indent=2)
+            return
+        with open(meta_path, encoding="utf-8") as f:
+            if json.load(f) != meta:
+                raise ValueError(f"Feature store at {self.directory} has a different layout.")
+
+    def _drop_partial_rows(self, rows):
+        # A writer that died between column files leaves rows past the committed count.
+        for column, dtype in COLUMNS.items():
+            path = self._path(column)
+            committed = rows * np.dtype(dtype).itemsize
+            if os.path.exists(path) and os.path.getsize(path) > committed:
+                self.logger.warning(f"Dropping uncommitted rows from {path}.")
+                with open(path, "r+b") as f:
+                    f.truncate(committed)
+
+    def append(self, records):
+        """records: (result_key, image_hash, extract_components output) tuples, hashes as hex strings."""
+        if not self.enabled or not records:
+            return
+
+        now = time.time()
+        columns = {
+            "image_hash": [bytes.fromhex(image_hash) for _, image_hash, _ in records],
+            "created": [now] * len(records),
+            "face_detection_failed": [post["face_detection_failed"] for _, _, post in records],
+            "width_px": [post["width_px"] for _, _, post in records],
+            "height_px": [post["height_px"] for _, _, post in records],
+            "size_kb": [_size_kb(post["size"]) for _, _, post in records],
+            "audience_top": [
+                AUDIENCE_LABELS.index(post["audience_top"]) if post["audience_top"] in AUDIENCE_LABELS else -1
+                for _, _, post in records
+            ],
+            "key": [bytes.fromhex(key) for key, _, _ in records],
+        }
+        for name in COMPONENTS:
+            columns[name] = [post[name] for _, _, post in records]
+
+        with self._lock:
+            self._ensure_layout()
+            with file_lock(self.directory):
+                self._drop_partial_rows(self.rows())
+                for column, dtype in COLUMNS.items():
+                    with open(self._path(column), "ab") as f:
+                        f.write(np.asarray(columns[column], dtype=dtype).tobytes())
+
+    def columns(self):
+        rows = self.rows()
+        return {
+            column: np.memmap(self._path(column), dtype=dtype, mode="r", shape=(rows,)) if rows else np.zeros(0, dtype)
+            for column, dtype in COLUMNS.items()
+        }
+
+
+feature_store = FeatureStore()
+
+
+def latest_rows(keys):
+    # Posts analyzed more than once keep their most recent features.
+    _, first_in_reversed = np.unique(keys[::-1], return_index=True)
+    return np.sort(len(keys) - 1 - first_in_reversed)
+
+
+def rescore(store, weights=None, out_path=None, all_rows=False, tips=True, chunk_rows=500000):
+    weights = resolve_weights(weights)
+    columns = store.columns()
+    rows = np.arange(len(columns["key"])) if all_rows else latest_rows(columns["key"])
+
+    started = time.perf_counter()
+    out = open(out_path, "w", encoding="utf-8", newline="") if out_path else sys.stdout
+    try:
+        writer = csv.writer(out)
+        writer.writerow(["key", "image_hash", "final_score", "ci_low", "ci_high", "final_analyse"] + (["tips"] if tips else []))
+        for start in range(0, len(rows), chunk_rows):
+            index = rows[start:start + chunk_rows]
+            chunk = {column: np.asarray(values[index]) for column, values in columns.items()}
+            scored = score_batch(chunk, weights)
+
+            output = [
+                # numpy drops trailing zero bytes of fixed-width bytes values.
+                [key.ljust(32, b"\0").hex() for key in chunk["key"].tolist()],
+                [image_hash.ljust(32, b"\0").hex() for image_hash in chunk["image_hash"].tolist()],
+                scored["final_score"].tolist(),
+                scored["ci_low"].tolist(),
+                scored["ci_high"].tolist(),
+                scored["category"].tolist(),
+            ]
+            if tips:
+                labels = np.asarray([None] + AUDIENCE_LABELS, dtype=object)
+                chunk["audience_top"] = labels[chunk["audience_top"].astype(np.int64) + 1]
+                chunk["size"] = ["" if np.isnan(size) else f"{size} KB" for size in chunk["size_kb"].tolist()]
+                output.append(tips_batch(chunk))
+            writer.writerows(zip(*output))
+    finally:
+        if out_path:
+            out.close()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Re-scored {len(rows)} posts in {elapsed:.1f}s ({len(rows) / max(elapsed, 1e-9) * 60:,.0f} rows/min).",
+        file=sys.stderr
+    )
+    return len(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute final scores and tips from stored features, without loading any model.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rescore_parser = subparsers.add_parser("rescore")
+    rescore_parser.add_argument("--weights", default=None,
+                                help="JSON object or path to a JSON file with the weights to override.")
+    rescore_parser.add_argument("--dir", default=None, help="Feature store directory (defaults to FEATURE_STORE_DIR).")
+    rescore_parser.add_argument("--out", default=None, help="CSV output path (defaults to stdout).")
+    rescore_parser.add_argument("--all-rows", action="store_true", help="Keep every stored row, not only the latest per post.")
+    rescore_parser.add_argument("--no-tips", action="store_true", help="Skip the tips column.")
+    args = parser.parse_args(argv)
+
+    store = FeatureStore(args.dir) if args.dir else feature_store
+    if not store.enabled:
+        parser.error("set FEATURE_STORE_DIR or pass --dir")
+
+    weights = None
+    if args.weights:
+        if os.path.exists(args.weights):
+            with open(args.weights, encoding="utf-8") as f:
+                weights = json.load(f)
+        else:
+            weights = json.loads(args.weights)
+
+    rescore(store, weights, args.out, all_rows=args.all_rows, tips=not args.no_tips)
+
+
+if __name__ == "__main__":
+    main()
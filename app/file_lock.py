@@ -0,0 +1,21 @@
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no fork, so a single process owns the files.
+    fcntl = None
+
+
+@contextmanager
+def file_lock(folder):
+    """Serializes writers across worker processes that share the files in `folder`."""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(folder, "lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
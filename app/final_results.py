@@ -1,4 +1,37 @@
-import math
+import os
+import json
+
+import numpy as np
+
+# Columns accepted by score_batch, in the order used for the confidence interval.
+COMPONENTS = (
+    "clip_similarity",
+    "sentiment",
+    "hashtag_similarity",
+    "hashtag_count",
+    "readability",
+    "faces",
+    "dimension_quality",
+)
+
+DEFAULT_WEIGHTS = {
+    "clip_similarity": 0.30,
+    "sentiment": 0.15,
+    "hashtag_similarity": 0.10,
+    "hashtag_count": 0.15,
+    "readability": 0.10,
+    "faces": 0.15,
+    "dimension_quality": 0.05,
+}
+
+CATEGORIES = ("Needs improvement", "Fair", "Good", "Excellent")
+
+Z_SCORES = {0.90: 1.645, 0.95: 1.96, 0.99: 2.576}
+
+# Components not computed yet are counted at a uniform prior over [0, 1]; faces is a coin flip.
+PRIOR_MEAN = {name: 0.5 for name in COMPONENTS}
+PRIOR_VARIANCE = {**{name: 1.0 / 12.0 for name in COMPONENTS}, "faces": 0.25}
+
 
 def _sentiment_to_score(label: str, score: float):
     lab = (label or "").strip().lower()
@@ -14,134 +47,142 @@ def _to_int(px_str: str):
     except Exception:
         return 0
 
+def _round1(values):
+    # np.round scales by 10 first, which can turn a value just off a .x5 tie into one; round() is exact.
+    values = np.asarray(values, dtype=np.float64)
+    rounded = np.round(values, 1)
+    scaled = values * 10.0
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_tie.any():
+        rounded[near_tie] = [round(float(v), 1) for v in values[near_tie]]
+    return rounded
+
+def resolve_weights(weights=None):
+    # SCORE_WEIGHTS (JSON) overrides the defaults for the whole process; `weights` overrides both.
+    weights = {**DEFAULT_WEIGHTS, **json.loads(os.getenv("SCORE_WEIGHTS") or "{}"), **(weights or {})}
+    unknown = set(weights) - set(COMPONENTS)
+    if unknown:
+        raise ValueError(f"Unknown score weights: {sorted(unknown)}")
+    return weights
+
+def hashtag_note(hashtag_count):
+    hashtag_count = np.asarray(hashtag_count)
+    return np.select([hashtag_count >= 3, hashtag_count >= 1], [0.10, 0.05], 0.0)
+
+def component_scores(columns):
+    """Maps raw columns to the [0, 1] values that are weighted into the final score."""
+    scores = {name: np.asarray(columns[name], dtype=np.float64) for name in COMPONENTS}
+    scores["hashtag_count"] = hashtag_note(scores["hashtag_count"])
+    scores["faces"] = (scores["faces"] > 0).astype(np.float64)
+    return scores
+
+def confidence_bounds(final_0_1, values, weights, confidence=0.95, n_eff=30, extra_variance=0.0):
+    z = Z_SCORES.get(confidence, 1.96)
+    values = np.clip(np.asarray(values, dtype=np.float64), 0.0, 1.0)
+    weights = np.asarray(weights, dtype=np.float64)
+    n = max(1, int(n_eff))
+
+    variance = ((weights ** 2) * values * (1.0 - values) / (n + 3)).sum(axis=-1) + extra_variance
+    std_error = np.sqrt(np.maximum(0.0, variance))
+
+    lower = np.maximum(0.0, final_0_1 - z * std_error)
+    upper = np.minimum(1.0, final_0_1 + z * std_error)
+    return _round1(lower * 100.0), _round1(upper * 100.0)
+
 def confidence_interval(final_0_1, components, confidence=0.95, n_eff=30):
-  
-    z_map = {0.90: 1.645, 0.95: 1.96, 0.99: 2.576}
-    z = z_map.get(confidence, 1.96)
-    
-    n_list = [n_eff] * len(components)
+    values, weights = zip(*components)
+    lower, upper = confidence_bounds(final_0_1, values, weights, confidence, n_eff)
+    return float(lower), float(upper)
 
-    variance = 0.0
-    for (v, w), n in zip(components, n_list):
-        v = min(1.0, max(0.0, float(v)))
-        n = max(1, int(n))
-        var_v = (v * (1.0 - v)) / (n + 3)
-        variance += (w ** 2) * var_v
+def score_batch(columns, weights=None, confidence=0.95, n_eff=30, pending=()):
+    """Scores many posts at once from columnar component arrays (see COMPONENTS).
 
-    std_error = math.sqrt(max(0.0, variance))
+    Components named in `pending` are not known yet: they may be left out of `columns`, are scored at
+    their prior mean and widen the confidence interval by their prior variance.
+    """
+    weights = resolve_weights(weights)
+    rows = len(next(iter(columns.values())))
+    scores = component_scores({**{name: np.zeros(rows) for name in pending}, **columns})
+    for name in pending:
+        scores[name] = np.full(rows, PRIOR_MEAN[name])
 
-    lower = max(0.0, final_0_1 - z * std_error)
-    upper = min(1.0, final_0_1 + z * std_error)
+    values = np.stack([scores[name] for name in COMPONENTS], axis=-1)
+    weight_vector = np.array([weights[name] for name in COMPONENTS])
 
-    return round(lower * 100.0, 1), round(upper * 100.0, 1)
+    # Summed component by component, in the same order as the per-post formula, so scores match it exactly.
+    final_0_1 = np.zeros(values.shape[:-1])
+    for column, weight in enumerate(weight_vector):
+        final_0_1 = final_0_1 + weight * values[..., column]
+    final_0_1 = np.clip(final_0_1, 0.0, 1.0)
+    final_score = _round1(final_0_1 * 100.0)
+    known_weights = np.array([0.0 if name in pending else weights[name] for name in COMPONENTS])
+    extra_variance = sum(weights[name] ** 2 * PRIOR_VARIANCE[name] for name in pending)
+    ci_low, ci_high = confidence_bounds(final_0_1, values, known_weights, confidence, n_eff, extra_variance)
+    category = np.searchsorted([50, 65, 80], final_score, side="right")
 
+    return {
+        "final_score": final_score,
+        "ci_low": ci_low,
+        "ci_high": ci_high,
+        "category": np.asarray(CATEGORIES, dtype=object)[category],
+    }
 
-def final_result(image_result, text_result, clip_result, labels_hashtag_list):
-    image_analysis =  (image_result or {}).get("image_analysis", {})
-    img_dim = (image_analysis or {}).get("image_dimension", {})
+def extract_components(image_result, text_result, clip_result, labels_hashtag_list):
+    image_analysis = (image_result or {}).get("image_analysis", {}) or {}
+    img_dim = image_analysis.get("image_dimension", {}) or {}
     width_px = _to_int(img_dim.get("width", "0"))
     height_px = _to_int(img_dim.get("height", "0"))
-    size_str = img_dim.get("size", "")
-    face_detected = (image_analysis or {}).get("face_detected", 0)
-    min_side = min(width_px, height_px)
-    dim_quality = max(0.0, min(1.0, min_side / 720.0))
+    face_detected = image_analysis.get("face_detected", 0)
+    # face_detected holds an error dict when face detection failed.
+    faces = face_detected if isinstance(face_detected, (int, float)) else None
 
     seq_item = ((text_result or {}).get("text_analysis") or [{}])[0]
-    sequence_text = seq_item.get("sequence", "") or ""
     audience = seq_item.get("audience", {}) or {}
-    audience_top = max(audience, key=audience.get)
     sent = seq_item.get("sentiment", {}) or {}
-    sent_score = _sentiment_to_score(sent.get("label", ""), float(sent.get("score", 0.0)))
     readability = seq_item.get("readability", {}) or {}
-    readability_score = float(readability.get("score", 0.0))
 
     clip_item = (clip_result or {}).get("clip_analysis") or {}
-    seq_clip  = clip_item.get("sequence_analysis") or {}
-    clip_sim = float(seq_clip.get("similarity_normalized", seq_clip.get("similarity_normalized", 0.0)))
-    hashtags = (clip_item or {}).get("hashtag_analysis", []) or []
+    seq_clip = clip_item.get("sequence_analysis") or {}
+    hashtags = clip_item.get("hashtag_analysis", []) or []
+    frame_faces = [frame.get("image_analysis", {}).get("face_detected") for frame in image_analysis.get("frames") or []]
     avg_similarity_normalized = 0.0
     if hashtags:
         similarities = [float(h.get("similarity_normalized", 0.0)) for h in hashtags]
         avg_similarity_normalized = round(sum(similarities) / len(similarities), 3)
-    hashtags_labels = [h.get("label") for h in hashtags if h.get("label")] or []
-
-    hashtags_count = len(labels_hashtag_list)
-    if hashtags_count >= 3:
-        hashtags_note = 0.10
-    elif 1 <= hashtags_count <= 2:
-        hashtags_note = 0.05
-    else:
-        hashtags_note = 0
-    
-    w_clip = 0.30
-    w_sent = 0.15
-    w_hash = 0.10
-    w_hash_len = 0.15
-    w_read = 0.10
-    w_face = 0.15
-    w_dim  = 0.05
-
-    face_score = 1.0 if face_detected > 0 else 0.0
-    final_0_1 = (
-        w_clip * clip_sim +
-        w_sent * sent_score +
-        w_hash * avg_similarity_normalized +
-        w_hash_len * hashtags_note +
-        w_read * readability_score +
-        w_face * face_score +
-        w_dim  * dim_quality
-    )
 
-    final_0_1 = max(0.0, min(1.0, final_0_1))
-    final_score = round(final_0_1 * 100.0, 1)
-
-    components = [
-        (clip_sim, w_clip),
-        (sent_score, w_sent),
-        (avg_similarity_normalized, w_hash),
-        (hashtags_note, w_hash_len),
-        (readability_score, w_read),
-        (face_score, w_face),
-        (dim_quality, w_dim)
-    ]
-    ci_low, ci_high = confidence_interval(final_0_1, components)
-
-    if final_score >= 80:
-        final_analyse = "Excellent"
-    elif final_score >= 65:
-        final_analyse = "Good"
-    elif final_score >= 50:
-        final_analyse = "Fair"
-    else:
-        final_analyse = "Needs improvement"
-
-    tips = []
-    tips.append(f"Your strongest audience is: {audience_top}.")
-    if face_detected == 0:
-        tips.append("Consider featuring a face in the image to increase engagement.")
-    if dim_quality < 0.6:
-        tips.append(f"The image is relatively small ({width_px}×{height_px}, {size_str}). A larger resolution may improve perceived quality.")
-    if readability_score < 0.4:
-        tips.append("The caption reads as difficult; simplifying the text may improve comprehension.")
-    if clip_sim < 0.6:
-        tips.append("Image–caption alignment is moderate; refine the caption to better match the visual content.")
-    if hashtags_count == 0:
-        tips.append("No hashtags detected. Consider adding at least 3 to maximize reach.")
-    elif hashtags_count < 3:
-        tips.append(f"{hashtags_count} hashtag(s) detected. Consider using 3 or more for better discoverability.")
-    else:
-        tips.append(f"{hashtags_count} hashtags detected. Good coverage for discoverability.")
-    explanation = " ".join(tips).strip()
-
-    score_explanation = (
+    return {
+        "clip_similarity": float(seq_clip.get("similarity_normalized", 0.0)),
+        "sentiment": _sentiment_to_score(sent.get("label", ""), float(sent.get("score", 0.0))),
+        "hashtag_similarity": avg_similarity_normalized,
+        "hashtag_count": len(labels_hashtag_list),
+        "readability": float(readability.get("score", 0.0)),
+        "faces": faces or 0,
+        "dimension_quality": max(0.0, min(1.0, min(width_px, height_px) / 720.0)),
+        # Only used to build the text of the result.
+        "face_detection_failed": faces is None,
+        "width_px": width_px,
+        "height_px": height_px,
+        "size": img_dim.get("size", ""),
+        "sequence": seq_item.get("sequence", "") or "",
+        "audience_top": max(audience, key=audience.get) if audience else None,
+        "hashtags": [h.get("label") for h in hashtags if h.get("label")],
+        # Carousel images and video keyframes; empty for single-image posts.
+        "frames": [
+            {**frame, "faces": faces if isinstance(faces, int) else None}
+            for frame, faces in zip(clip_item.get("frame_analysis") or [], frame_faces)
+        ],
+    }
+
+def score_explanation(final_score, weights):
+    return (
         f"The final score of {final_score} reflects a weighted combination of key factors: "
-        f"{int(w_clip*100)}% from image–caption alignment (CLIP similarity), "
-        f"{int(w_sent*100)}% from sentiment positivity, "
-        f"{int(w_hash*100)}% from hashtag relevance, "
-        f"{int(w_hash_len*100)}% from hashtag quantity, "
-        f"{int(w_read*100)}% from caption readability, "
-        f"{int(w_face*100)}% from face presence, and "
-        f"{int(w_dim*100)}% from image size and quality. "
+        f"{int(weights['clip_similarity']*100)}% from image–caption alignment (CLIP similarity), "
+        f"{int(weights['sentiment']*100)}% from sentiment positivity, "
+        f"{int(weights['hashtag_similarity']*100)}% from hashtag relevance, "
+        f"{int(weights['hashtag_count']*100)}% from hashtag quantity, "
+        f"{int(weights['readability']*100)}% from caption readability, "
+        f"{int(weights['faces']*100)}% from face presence, and "
+        f"{int(weights['dimension_quality']*100)}% from image size and quality. "
         f"And the analises of final score:"
         f"The interpretation of the final score is as follows: "
         f"Scores below 50 indicate a need for improvement, "
@@ -150,17 +191,79 @@ def final_result(image_result, text_result, clip_result, labels_hashtag_list):
         f"and scores above 80 are classified as excellent."
     )
 
+def tips_batch(posts):
+    """posts: columns of extract_components output (lists or arrays), one tips string per row."""
+    audience_top = list(posts["audience_top"])
+    no_face = ((np.asarray(posts["faces"]) == 0) & ~np.asarray(posts["face_detection_failed"], dtype=bool)).tolist()
+    small = (np.asarray(posts["dimension_quality"]) < 0.6).tolist()
+    difficult = (np.asarray(posts["readability"]) < 0.4).tolist()
+    weak_alignment = (np.asarray(posts["clip_similarity"]) < 0.6).tolist()
+    hashtag_counts = np.asarray(posts["hashtag_count"]).tolist()
+    width, height, size = list(posts["width_px"]), list(posts["height_px"]), list(posts["size"])
+
+    results = []
+    for i, hashtags_count in enumerate(hashtag_counts):
+        tips = []
+        if audience_top[i]:
+            tips.append(f"Your strongest audience is: {audience_top[i]}.")
+        if no_face[i]:
+            tips.append("Consider featuring a face in the image to increase engagement.")
+        if small[i]:
+            tips.append(f"The image is relatively small ({width[i]}×{height[i]}, {size[i]}). A larger resolution may improve perceived quality.")
+        if difficult[i]:
+            tips.append("The caption reads as difficult; simplifying the text may improve comprehension.")
+        if weak_alignment[i]:
+            tips.append("Image–caption alignment is moderate; refine the caption to better match the visual content.")
+        if hashtags_count == 0:
+            tips.append("No hashtags detected. Consider adding at least 3 to maximize reach.")
+        elif hashtags_count < 3:
+            tips.append(f"{hashtags_count} hashtag(s) detected. Consider using 3 or more for better discoverability.")
+        else:
+            tips.append(f"{hashtags_count} hashtags detected. Good coverage for discoverability.")
+        results.append(" ".join(tips).strip())
+    return results
+
+def score_posts(posts, weights=None):
+    """posts: extract_components outputs; one vectorized scoring pass."""
+    if not posts:
+        return []
+
+    weights = resolve_weights(weights)
+    columns = {name: [post[name] for post in posts] for name in posts[0]}
+    scored = score_batch(columns, weights)
+    tips = tips_batch(columns)
+
+    results = []
+    for i, post in enumerate(posts):
+        final_score = float(scored["final_score"][i])
+        results.append({
+            "sequence": post["sequence"],
+            "hashtags": post["hashtags"],
+            "final_analyse": scored["category"][i],
+            "final_score": final_score,
+            "confidence_interval": (float(scored["ci_low"][i]), float(scored["ci_high"][i])),
+            "score_explanation": score_explanation(final_score, weights),
+            "tips": tips[i],
+        })
+        if post.get("frames"):
+            results[-1]["frames"] = post["frames"]
+    return results
+
+def provisional_result(post, pending, weights=None):
+    """Score of one extract_components output while the components in `pending` are still being computed."""
+    pending = sorted(pending)
+    # Pending values are passed along too (score_batch replaces them), so there is always a row to score.
+    scored = score_batch({name: [post.get(name, 0.0)] for name in COMPONENTS}, weights, pending=pending)
     return {
-        "sequence": sequence_text,
-        "hashtags": hashtags_labels,
-        "final_analyse": final_analyse,
-        "final_score": final_score,
-        "confidence_interval": (ci_low, ci_high),
-        "score_explanation": score_explanation,
-        "tips": explanation,
-        # "complete_analysis": [
-        #     image_result,
-        #     text_result,
-        #     clip_result
-        # ]
-    }
\ No newline at end of file
+        "final_analyse": scored["category"][0],
+        "final_score": float(scored["final_score"][0]),
+        "confidence_interval": (float(scored["ci_low"][0]), float(scored["ci_high"][0])),
+        "pending": pending,
+    }
+
+def final_result_batch(items, weights=None):
+    """items: (image_result, text_result, clip_result, labels_hashtag_list) tuples."""
+    return score_posts([extract_components(*item) for item in items], weights)
+
+def final_result(image_result, text_result, clip_result, labels_hashtag_list):
+    return final_result_batch([(image_result, text_result, clip_result, labels_hashtag_list)])[0]
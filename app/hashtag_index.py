@@ -0,0 +1,135 @@
+import os
+import re
+import json
+import threading
+
+import numpy as np
+
+from app.file_lock import file_lock
+from app.logger import LogManager
+
+
+class HashtagEmbeddingIndex:
+    def __init__(self, directory=None):
+
+        log_manager = LogManager('hashtagIndex')
+        self.logger = log_manager.get_logger()
+
+        self.directory = directory or os.getenv(
+            "HASHTAG_INDEX_DIR",
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "hashtag_index")
+        )
+        self.model_name = None
+        self.dim = None
+        self.rows = {}
+        self.tags = []
+        self.matrix = None
+        self._tags_offset = 0
+        self._lock = threading.Lock()
+
+    def _paths(self, model_name):
+        folder = os.path.join(self.directory, re.sub(r"[^\w.-]+", "_", model_name))
+        return (
+            folder,
+            os.path.join(folder, "embeddings.f16"),
+            os.path.join(folder, "index.json"),
+            os.path.join(folder, "tags.txt")
+        )
+
+    def open(self, model_name, dim):
+        with self._lock:
+            if self.model_name == model_name and self.dim == dim:
+                return
+
+            folder, matrix_path, index_path, tags_path = self._paths(model_name)
+            os.makedirs(folder, exist_ok=True)
+            with file_lock(folder):
+                self._open(model_name, dim, folder, matrix_path, index_path, tags_path)
+
+    def _open(self, model_name, dim, folder, matrix_path, index_path, tags_path):
+        tags = []
+        if os.path.exists(index_path) and os.path.exists(tags_path):
+            with open(index_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("dim") == dim:
+                # Rows are written before their tag line, so every listed tag has its embedding.
+                with open(tags_path, encoding="utf-8") as f:
+                    tags = [line.rstrip("\n") for line in f if line.strip()]
+            else:
+                self.logger.warning(f"Hashtag index at {folder} has dim {meta.get('dim')}, expected {dim}; rebuilding.")
+
+        if not tags:
+            with open(index_path, "w", encoding="utf-8") as f:
+                json.dump({"model": model_name, "dim": dim}, f)
+            open(tags_path, "w", encoding="utf-8").close()
+
+        self.model_name = model_name
+        self.dim = dim
+        self.tags = tags
+        self.rows = {tag: row for row, tag in enumerate(tags)}
+        self._tags_offset = os.path.getsize(tags_path)
+        self.matrix = self._map(matrix_path, max(len(tags), 1024))
+        self.logger.info(f"Hashtag index loaded: {len(tags)} hashtags for {model_name}.")
+
+    def _map(self, matrix_path, capacity):
+        required = capacity * self.dim * np.dtype(np.float16).itemsize
+        if not os.path.exists(matrix_path) or os.path.getsize(matrix_path) < required:
+            with open(matrix_path, "ab") as f:
+                f.truncate(required)
+        rows = os.path.getsize(matrix_path) // (self.dim * np.dtype(np.float16).itemsize)
+        return np.memmap(matrix_path, dtype=np.float16, mode="r+", shape=(rows, self.dim))
+
+    def lookup(self, tags):
+        with self._lock:
+            known = [tag for tag in tags if tag in self.rows]
+            embeddings = {}
+            if known:
+                block = np.asarray(self.matrix[[self.rows[tag] for tag in known]], dtype=np.float32)
+                embeddings = dict(zip(known, block))
+        missing = [tag for tag in dict.fromkeys(tags) if tag not in embeddings]
+        return embeddings, missing
+
+    def _refresh(self, matrix_path, tags_path):
+        # Picks up tags appended by other worker processes since this one last read the file.
+        if os.path.getsize(tags_path) == self._tags_offset:
+            return
+        with open(tags_path, "rb") as f:
+            f.seek(self._tags_offset)
+            appended = f.read()
+        self._tags_offset += len(appended)
+
+        for tag in appended.decode("utf-8").splitlines():
+            if tag.strip():
+                self.rows[tag] = len(self.tags)
+                self.tags.append(tag)
+        if len(self.tags) > self.matrix.shape[0]:
+            self.matrix = self._map(matrix_path, len(self.tags))
+
+    def add(self, tags, embeddings):
+        with self._lock:
+            folder, matrix_path, _, tags_path = self._paths(self.model_name)
+            with file_lock(folder):
+                self._refresh(matrix_path, tags_path)
+                new = list({tag: emb for tag, emb in zip(tags, embeddings) if tag not in self.rows}.items())
+                if not new:
+                    return
+
+                needed = len(self.tags) + len(new)
+                if needed > self.matrix.shape[0]:
+                    self.matrix.flush()
+                    self.matrix = self._map(matrix_path, max(needed, self.matrix.shape[0] * 2))
+
+                start = len(self.tags)
+                self.matrix[start:needed] = np.stack([emb for _, emb in new]).astype(np.float16)
+                self.matrix.flush()
+
+                with open(tags_path, "a", encoding="utf-8") as f:
+                    f.write("".join(f"{tag}\n" for tag, _ in new))
+                self._tags_offset = os.path.getsize(tags_path)
+
+                for offset, (tag, _) in enumerate(new):
+                    self.rows[tag] = start + offset
+                    self.tags.append(tag)
+
+    def __len__(self):
+        return len(self.tags)
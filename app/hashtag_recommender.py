@@ -0,0 +1,154 @@
+import os
+import sys
+import argparse
+
+import numpy as np
+
+from app.logger import LogManager
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def train_centroids(embeddings, nlist, iterations=10, sample_size=100000, seed=0):
+    rng = np.random.default_rng(seed)
+    sample = embeddings
+    if len(sample) > sample_size:
+        sample = embeddings[rng.choice(len(embeddings), sample_size, replace=False)]
+
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+
+        empty = np.bincount(assignment, minlength=nlist) == 0
+        sums[empty] = sample[rng.integers(len(sample), size=int(empty.sum()))]
+        centroids = _normalize(sums)
+
+    return centroids.astype(np.float32)
+
+
+def build_index(tags, embeddings, out_dir, nlist=None, iterations=10):
+    embeddings = _normalize(np.asarray(embeddings, dtype=np.float32))
+    nlist = nlist or max(1, min(len(tags), int(4 * np.sqrt(len(tags)))))
+
+    centroids = train_centroids(embeddings, nlist, iterations=iterations)
+
+    assignment = np.empty(len(embeddings), dtype=np.int64)
+    for start in range(0, len(embeddings), 65536):
+        assignment[start:start + 65536] = np.argmax(embeddings[start:start + 65536] @ centroids.T, axis=1)
+
+    order = np.argsort(assignment, kind="stable")
+    offsets = np.zeros(nlist + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(assignment, minlength=nlist))
+
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, "centroids.npy"), centroids)
+    np.save(os.path.join(out_dir, "vectors.npy"), embeddings[order].astype(np.float16))
+    np.save(os.path.join(out_dir, "offsets.npy"), offsets)
+    with open(os.path.join(out_dir, "tags.txt"), "w", encoding="utf-8") as f:
+        f.write("".join(f"{tags[i]}\n" for i in order))
+
+
+class HashtagRecommender:
+    def __init__(self, directory=None):
+
+        log_manager = LogManager('hashtagRecommender')
+        self.logger = log_manager.get_logger()
+
+        self.directory = directory or os.getenv(
+            "HASHTAG_ANN_DIR",
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "hashtag_ann")
+        )
+        self.nprobe = int(os.getenv("HASHTAG_ANN_NPROBE", "16"))
+        self.top_k = int(os.getenv("HASHTAG_SUGGESTIONS_K", "5"))
+
+        self.centroids = None
+        self.vectors = None
+        self.offsets = None
+        self.tags = []
+
+    @property
+    def available(self):
+        return self.centroids is not None
+
+    def load(self):
+        centroids_path = os.path.join(self.directory, "centroids.npy")
+        if not os.path.exists(centroids_path):
+            self.logger.info(f"No hashtag ANN index found at {self.directory}; suggestions disabled.")
+            return
+
+        self.centroids = np.load(centroids_path)
+        self.vectors = np.load(os.path.join(self.directory, "vectors.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(self.directory, "offsets.npy"))
+        with open(os.path.join(self.directory, "tags.txt"), encoding="utf-8") as f:
+            self.tags = [line.rstrip("\n") for line in f]
+
+        self.logger.info(f"Hashtag ANN index loaded: {len(self.tags)} hashtags, {len(self.centroids)} lists.")
+
+    def search(self, image_embedding, k=None, exclude=()):
+        if not self.available or image_embedding is None:
+            return []
+
+        k = k or self.top_k
+        query = np.asarray(image_embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        excluded = {tag.lower() for tag in exclude}
+
+        nprobe = min(self.nprobe, len(self.centroids))
+        lists = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+
+        rows = np.concatenate([np.arange(self.offsets[c], self.offsets[c + 1]) for c in lists])
+        if not len(rows):
+            return []
+
+        scores = np.asarray(self.vectors[rows], dtype=np.float32) @ query
+        candidates = min(len(rows), k + len(excluded))
+        best = np.argpartition(-scores, candidates - 1)[:candidates]
+        best = best[np.argsort(-scores[best])]
+
+        suggestions = []
+        for i in best:
+            tag = self.tags[rows[i]]
+            if tag.lower() in excluded:
+                continue
+            suggestions.append({"label": tag, "similarity_normalized": round((float(scores[i]) + 1) / 2, 3)})
+            if len(suggestions) == k:
+                break
+
+        return suggestions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the hashtag ANN index used for hashtag suggestions.")
+    parser.add_argument("vocabulary", help="Text file with one hashtag per line.")
+    parser.add_argument("--out", default=None, help="Output directory (defaults to HASHTAG_ANN_DIR).")
+    parser.add_argument("--nlist", type=int, default=None, help="Number of inverted lists.")
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args(argv)
+
+    from app.clip_analyser import ClipAnalyzer
+    from app.model_registry import model_registry
+
+    with open(args.vocabulary, encoding="utf-8") as f:
+        tags = list(dict.fromkeys(line.strip() for line in f if line.strip()))
+
+    # Embeddings go through the persistent hashtag table, so tags already seen in
+    # production are not encoded again and new ones are kept for later requests.
+    clip_analyzer = ClipAnalyzer(models=model_registry)
+    embeddings = []
+    for start in range(0, len(tags), args.batch_size):
+        batch = tags[start:start + args.batch_size]
+        embeddings.append(clip_analyzer.hashtag_embeddings(batch))
+        print(f"Encoded {min(start + args.batch_size, len(tags))}/{len(tags)} hashtags", file=sys.stderr)
+
+    out_dir = args.out or HashtagRecommender().directory
+    build_index(tags, np.concatenate(embeddings), out_dir, nlist=args.nlist)
+    print(f"Index with {len(tags)} hashtags written to {out_dir}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,20 @@
-import urllib
-import cv2
-
-import numpy as np
-
+from app.face_detector import FaceDetector
 from app.logger import LogManager
+from app.metrics import stage
 
 class ImageAnalyzer:
-    def __init__(self, image_path):
+    def __init__(self, face_detector=None):
         
         log_manager = LogManager('imageAnalyzer')
         self.logger = log_manager.get_logger()
-        
-        resp = urllib.request.urlopen(image_path)
-        self.data = resp.read()
-        
-        image_array = np.asarray(bytearray(self.data), dtype=np.uint8)
-        img = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
 
-        self.img = img
+        self.face_detector = face_detector or FaceDetector()
 
 
-    def image_dimensions(self):
+    def image_dimensions(self, image):
   
-        height, width = self.img.shape[:2]
-        size_kb = round(len(self.data) / 1024.0, 2)
+        height, width = image.height, image.width
+        size_kb = round(image.size_bytes / 1024.0, 2)
 
         return {
             'width': f"{width} px",
@@ -31,41 +22,81 @@ class ImageAnalyzer:
             'size': f"{size_kb} KB"
         }
 
-    def have_faces(self):
+    def to_original(self, faces, image):
+        # Boxes come back in decoded-pixel coordinates; report them against the original image.
+        scale = image.scale
+        if scale == 1.0:
+            return faces
+        for face in faces:
+            for key in ("x", "y", "width", "height"):
+                face[key] = int(round(face[key] * scale))
+        return faces
 
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        gray = cv2.cvtColor(self.img, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+    def detect_faces(self, image):
+        return self.to_original(self.face_detector.detect(image.pixels), image)
 
-        if len(faces) == 0:
-            return 0
-        else:
-            return len(faces)
+    def have_faces(self, image):
+        return len(self.detect_faces(image))
 
-    def analyser(self):
-        self.logger.info("Starting image analysis pipeline.")
+    def analyser(self, image):
+        return self.analyser_batch([image])[0]
 
-        try:
-            self.logger.info("Step 1: Running image dimension analysis...")
-            image_dimension_result = self.image_dimensions()
-            self.logger.info("Image dimension analysis completed successfully.")
-        except Exception as e:
-            self.logger.error(f"Error during image dimension analysis: {e}", exc_info=True)
-            image_dimension_result = {"error": str(e)}
+    def analyser_batch(self, images):
+        self.logger.info(f"Starting image analysis pipeline for {len(images)} image(s).")
+
+        self.logger.info("Step 1: Running image dimension analysis...")
+        dimension_results = []
+        with stage("image.dimensions"):
+            for image in images:
+                try:
+                    dimension_results.append(self.image_dimensions(image))
+                    self.logger.debug("Image dimensions: %sx%s", image.width, image.height)
+                except Exception as e:
+                    self.logger.error(f"Error during image dimension analysis: {e}", exc_info=True)
+                    dimension_results.append({"error": str(e)})
+        self.logger.info("Image dimension analysis completed successfully.")
 
         try:
-            self.logger.info("Step 2: Running face detection analysis...")
-            face_result = self.have_faces()
+            self.logger.info(f"Step 2: Running {self.face_detector.backend} face detection...")
+            with stage("image.faces"):
+                face_results = [
+                    self.to_original(faces, image)
+                    for faces, image in zip(self.face_detector.detect_batch([image.pixels for image in images]), images)
+                ]
             self.logger.info("Face detection analysis completed successfully.")
         except Exception as e:
             self.logger.error(f"Error during face detection analysis: {e}", exc_info=True)
-            face_result = {"error": str(e)}
+            face_results = [{"error": str(e)}] * len(images)
 
         self.logger.info("Image analysis process finished.")
 
+        results = []
+        for dimension_result, faces in zip(dimension_results, face_results):
+            image_analysis = {"image_dimension": dimension_result}
+            if isinstance(faces, dict):
+                image_analysis["face_detected"] = faces
+            else:
+                image_analysis["face_detected"] = len(faces)
+                image_analysis["faces"] = faces
+            results.append({"image_analysis": image_analysis})
+        return results
+
+    def combine(self, media, frame_results):
+        """Folds the per-frame results of a carousel or video into one image_analysis."""
+        analyses = [result.get("image_analysis") for result in frame_results]
+        if not any(analyses):
+            return frame_results[0]
+
+        first = next(analysis for analysis in analyses if analysis)
+        face_counts = [analysis["face_detected"] for analysis in analyses if analysis and isinstance(analysis.get("face_detected"), int)]
         return {
             "image_analysis": {
-                "image_dimension": image_dimension_result,
-                "face_detected": face_result
+                "image_dimension": {**first["image_dimension"], "size": f"{round(media.size_bytes / 1024.0, 2)} KB"},
+                # The most faces seen in any frame; an error only when detection failed on every frame.
+                "face_detected": max(face_counts) if face_counts else first["face_detected"],
+                "frames": [
+                    {**info, "image_analysis": analysis} if analysis else {**info, **result}
+                    for info, analysis, result in zip(media.frame_info, analyses, frame_results)
+                ],
             }
         }
@@ -0,0 +1,231 @@
+import io
+import os
+import copy
+import asyncio
+import hashlib
+import urllib.request
+
+import cv2
+import httpx
+import numpy as np
+
+from app.cache import content_hash, feature_cache
+from app.logger import LogManager
+
+
+class ImageTooLargeError(ValueError):
+    pass
+
+
+class UnsupportedURLError(ValueError):
+    pass
+
+
+# OpenCV decodes JPEGs at 1/2, 1/4 or 1/8 scale straight from the DCT coefficients.
+REDUCED_DECODE_FLAGS = {
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    1: cv2.IMREAD_COLOR,
+}
+
+# Enough to reach the size in nearly every header, including JPEGs with large EXIF, ICC or XMP segments.
+HEADER_BYTES = 256 * 1024
+
+
+class LoadedImage:
+    def __init__(self, data, pixels, content_hash=None, original_size=None):
+        self.data = data
+        self.pixels = pixels
+        self.content_hash = content_hash
+        # (width, height) of the encoded image; pixels may have been decoded at a reduced scale.
+        self.original_size = original_size
+        self.size_bytes = len(data) if data is not None else 0
+        self.clip_embedding = None
+
+    @property
+    def height(self):
+        return self.original_size[1] if self.original_size else self.pixels.shape[0]
+
+    @property
+    def width(self):
+        return self.original_size[0] if self.original_size else self.pixels.shape[1]
+
+    @property
+    def scale(self):
+        return self.width / self.pixels.shape[1]
+
+    @property
+    def frames(self):
+        return [self]
+
+    def copy(self):
+        # Shares the decoded pixels; the embedding and the pixels reference can then change per copy.
+        return copy.copy(self)
+
+
+class ImageLoader:
+    def __init__(self):
+
+        log_manager = LogManager('imageLoader')
+        self.logger = log_manager.get_logger()
+
+        self.max_bytes = int(os.getenv("IMAGE_MAX_BYTES", str(20 * 1024 * 1024)))
+        self.timeout = float(os.getenv("IMAGE_FETCH_TIMEOUT", "10"))
+        self.max_connections = int(os.getenv("IMAGE_FETCH_MAX_CONNECTIONS", "32"))
+        # Smallest decoded size that still serves face detection (longest side) and CLIP (shortest side);
+        # IMAGE_DECODE_MAX_SIDE=0 always decodes at full resolution.
+        self.decode_max_side = int(os.getenv("IMAGE_DECODE_MAX_SIDE", os.getenv("FACE_DETECTION_MAX_SIDE", "640")))
+        self.decode_min_side = int(os.getenv("IMAGE_DECODE_MIN_SIDE", "224"))
+        self.client = None
+
+    async def open(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(max_connections=self.max_connections),
+                follow_redirects=True
+            )
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def _check_size(self, size, max_bytes=None, kind="Image"):
+        max_bytes = max_bytes or self.max_bytes
+        if size > max_bytes:
+            raise ImageTooLargeError(f"{kind} exceeds the {max_bytes} byte limit.")
+
+    def _scheme(self, url):
+        scheme = url.split(":", 1)[0].lower() if ":" in url else ""
+        if scheme not in ("http", "https", "data"):
+            raise UnsupportedURLError(f"Unsupported URL scheme '{scheme}', expected http, https or data.")
+        return scheme
+
+    def read_data_url(self, url, max_bytes=None, kind="Image"):
+        """Decodes a data: URL. Blocking, so async callers run it off the event loop."""
+        if self._scheme(url) != "data":
+            raise UnsupportedURLError("Only data: URLs are read locally.")
+        max_bytes = max_bytes or self.max_bytes
+        with urllib.request.urlopen(url) as resp:
+            data = resp.read(max_bytes + 1)
+        self._check_size(len(data), max_bytes, kind)
+        return data
+
+    def save_data_url(self, url, path, max_bytes, kind):
+        data = self.read_data_url(url, max_bytes, kind)
+        with open(path, "wb") as f:
+            f.write(data)
+        return content_hash(data), len(data)
+
+    async def fetch_async(self, image_url, is_known=None, run_blocking=asyncio.to_thread):
+        if self._scheme(image_url) == "data":
+            # data: URLs carry the payload inline, there is nothing to download.
+            data = await run_blocking(self.read_data_url, image_url)
+            return data, content_hash(data)
+
+        await self.open()
+        async with self.client.stream("GET", image_url) as resp:
+            resp.raise_for_status()
+
+            etag = resp.headers.get("etag")
+            url_key = content_hash(image_url, etag) if etag else None
+            if url_key and is_known is not None:
+                known_hash = await feature_cache.get_async("url", url_key, run_blocking)
+                if known_hash and await is_known(known_hash):
+                    self.logger.info("Image features already cached for this URL and ETag; skipping download.")
+                    return None, known_hash
+
+            expected = int(resp.headers.get("content-length") or 0)
+            self._check_size(expected)
+
+            # Chunks are copied into one buffer as they arrive, sized up front when the length is known,
+            # so the body is never held twice.
+            data = bytearray(expected)
+            received = 0
+            async for chunk in resp.aiter_bytes():
+                end = received + len(chunk)
+                self._check_size(end)
+                if end <= len(data):
+                    data[received:end] = chunk
+                else:
+                    # Compressed responses decode past their content-length.
+                    del data[received:]
+                    data += chunk
+                received = end
+            del data[received:]
+
+        data_hash = content_hash(data)
+        if url_key:
+            feature_cache.set("url", url_key, data_hash)
+        return data, data_hash
+
+    async def download(self, url, path, max_bytes, kind="Video", run_blocking=asyncio.to_thread):
+        """Streams url into path without holding it in memory; returns its content hash and size."""
+        if self._scheme(url) == "data":
+            return await run_blocking(self.save_data_url, url, path, max_bytes, kind)
+
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, "wb") as f:
+            await self.open()
+            async with self.client.stream("GET", url) as resp:
+                resp.raise_for_status()
+                self._check_size(int(resp.headers.get("content-length") or 0), max_bytes, kind)
+                async for chunk in resp.aiter_bytes():
+                    size += len(chunk)
+                    self._check_size(size, max_bytes, kind)
+                    digest.update(chunk)
+                    f.write(chunk)
+
+        # Same digest as content_hash(data).
+        digest.update(b"\x00")
+        return digest.hexdigest(), size
+
+    def header_size(self, data):
+        from PIL import Image
+
+        view = memoryview(data)
+        # PIL only parses the header here; a prefix keeps BytesIO from copying the whole body.
+        for header in ([view[:HEADER_BYTES], view] if len(view) > HEADER_BYTES else [view]):
+            try:
+                with Image.open(io.BytesIO(header)) as img:
+                    return img.size
+            except Exception:
+                continue
+        return None
+
+    def reduction(self, size):
+        if not size or self.decode_max_side <= 0:
+            return 1
+        for factor in (8, 4, 2):
+            if max(size) // factor >= self.decode_max_side and min(size) // factor >= self.decode_min_side:
+                return factor
+        return 1
+
+    def decode(self, data):
+        """Returns RGB pixels, decoded at the smallest scale the analyzers need, and the original (width, height)."""
+        size = self.header_size(data)
+        image_array = np.frombuffer(data, dtype=np.uint8)
+        img = cv2.imdecode(image_array, REDUCED_DECODE_FLAGS[self.reduction(size)])
+        if img is None:
+            raise ValueError("Could not decode image data.")
+
+        # Decode once and convert in place: CLIP consumes RGB and face detection
+        # only needs a grayscale view, so no BGR copy is kept around.
+        cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=img)
+
+        height, width = img.shape[:2]
+        if not size:
+            return img, (width, height)
+        # imdecode applies the EXIF orientation, the header size does not.
+        if abs(width / height - size[0] / size[1]) > abs(width / height - size[1] / size[0]):
+            size = (size[1], size[0])
+        return img, size
+
+    def load(self, image_url):
+        data = self.fetch(image_url)
+        pixels, size = self.decode(data)
+        self.logger.info(f"Image loaded: {size[0]}x{size[1]} decoded at {pixels.shape[1]}x{pixels.shape[0]}, {len(data)} bytes.")
+        return LoadedImage(data, pixels, content_hash(data), size)
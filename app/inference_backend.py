@@ -0,0 +1,343 @@
+import os
+import re
+import sys
+import json
+import argparse
+
+import numpy as np
+
+from app.logger import LogManager
+
+ORT_MODEL_CLASSES = {
+    "zero-shot-classification": "ORTModelForSequenceClassification",
+    "sentiment-analysis": "ORTModelForSequenceClassification",
+    "token-classification": "ORTModelForTokenClassification",
+}
+
+
+class OnnxClipModel:
+    """Exposes the parts of CLIPModel used by ClipAnalyzer on top of two ONNX Runtime sessions."""
+
+    def __init__(self, vision_session, text_session, config, logit_scale):
+        import torch
+
+        self.vision_session = vision_session
+        self.text_session = text_session
+        self.config = config
+        self.logit_scale = torch.tensor(logit_scale)
+
+    def eval(self):
+        return self
+
+    def get_image_features(self, pixel_values):
+        import torch
+
+        outputs = self.vision_session.run(None, {"pixel_values": pixel_values.cpu().numpy()})
+        return torch.from_numpy(outputs[0])
+
+    def get_text_features(self, input_ids, attention_mask):
+        import torch
+
+        outputs = self.text_session.run(None, {
+            "input_ids": input_ids.cpu().numpy().astype(np.int64),
+            "attention_mask": attention_mask.cpu().numpy().astype(np.int64),
+        })
+        return torch.from_numpy(outputs[0])
+
+
+class InferenceBackend:
+    def __init__(self):
+
+        log_manager = LogManager('inferenceBackend')
+        self.logger = log_manager.get_logger()
+
+        self.name = os.getenv("INFERENCE_BACKEND", "torch").lower()
+        if self.name not in ("torch", "onnx"):
+            raise ValueError(f"Unknown INFERENCE_BACKEND '{self.name}', expected 'torch' or 'onnx'.")
+
+        self.cache_dir = os.getenv(
+            "ONNX_CACHE_DIR",
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "onnx")
+        )
+        self.quantize = os.getenv("ONNX_QUANTIZE", "1") != "0"
+        # Each model has its own batcher thread, so up to four sessions run at once.
+        self.intra_op_threads = int(os.getenv("ONNX_INTRA_OP_THREADS", str(max(1, (os.cpu_count() or 1) // 4))))
+
+        self.mmap_weights = os.getenv("MODEL_MMAP_WEIGHTS", "0") == "1"
+        self.mmap_dir = os.getenv(
+            "MODEL_MMAP_DIR",
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "mmap")
+        )
+
+    @property
+    def onnx_file(self):
+        return "model_quantized.onnx" if self.quantize else "model.onnx"
+
+    def _model_dir(self, kind, model_name, root=None):
+        return os.path.join(root or self.cache_dir, kind, re.sub(r"[^\w.-]+", "_", model_name))
+
+    def session_options(self):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.intra_op_threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        return options
+
+    def _quantize(self, directory, names):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        for name in names:
+            source = os.path.join(directory, f"{name}.onnx")
+            target = os.path.join(directory, f"{name}_quantized.onnx")
+            if not os.path.exists(target):
+                self.logger.info(f"Quantizing {source} to int8...")
+                quantize_dynamic(source, target, weight_type=QuantType.QInt8)
+
+    def load_torch_model(self, auto_class, model_name):
+        if not self.mmap_weights:
+            return auto_class.from_pretrained(model_name).eval()
+
+        import torch
+        from transformers import AutoConfig
+        from transformers.modeling_utils import no_init_weights
+
+        directory = self._model_dir(auto_class.__name__, model_name, root=self.mmap_dir)
+        weights = os.path.join(directory, "state_dict.pt")
+        if not os.path.exists(weights):
+            self.logger.info(f"Writing mmap-able weights of {model_name} to {directory}...")
+            model = auto_class.from_pretrained(model_name).eval()
+            os.makedirs(directory, exist_ok=True)
+            torch.save(model.state_dict(), f"{weights}.tmp")
+            os.replace(f"{weights}.tmp", weights)
+            return model
+
+        # Tensors stay backed by the file, so workers on the same host share one copy in the page cache.
+        config = AutoConfig.from_pretrained(model_name)
+        with no_init_weights():
+            if hasattr(auto_class, "from_config"):
+                model = auto_class.from_config(config)
+            else:
+                model = auto_class._from_config(config)
+        state = torch.load(weights, mmap=True, weights_only=True, map_location="cpu")
+        model.load_state_dict(state, assign=True)
+        model.tie_weights()
+        return model.eval()
+
+    def text_pipeline(self, task, model_name, **kwargs):
+        if self.name == "torch":
+            from transformers import pipeline
+
+            if not self.mmap_weights:
+                return pipeline(task, model=model_name, **kwargs)
+
+            from transformers import AutoTokenizer, AutoModelForSequenceClassification, AutoModelForTokenClassification
+
+            auto_class = (
+                AutoModelForTokenClassification if task == "token-classification"
+                else AutoModelForSequenceClassification
+            )
+            model = self.load_torch_model(auto_class, model_name)
+            return pipeline(task, model=model, tokenizer=AutoTokenizer.from_pretrained(model_name), **kwargs)
+
+        import optimum.onnxruntime as ort_models
+        from transformers import AutoTokenizer
+
+        model_class = getattr(ort_models, ORT_MODEL_CLASSES[task])
+        directory = self._model_dir(task, model_name)
+
+        if not os.path.exists(os.path.join(directory, "model.onnx")):
+            self.logger.info(f"Exporting {model_name} to ONNX in {directory}...")
+            model_class.from_pretrained(model_name, export=True).save_pretrained(directory)
+            AutoTokenizer.from_pretrained(model_name).save_pretrained(directory)
+        if self.quantize:
+            self._quantize(directory, ["model"])
+
+        model = model_class.from_pretrained(
+            directory,
+            file_name=self.onnx_file,
+            session_options=self.session_options(),
+            provider="CPUExecutionProvider"
+        )
+        return ort_models.pipeline(task, model=model, tokenizer=AutoTokenizer.from_pretrained(directory), **kwargs)
+
+    def export_clip(self, model_name, directory):
+        import torch
+        from transformers import CLIPModel
+
+        class ImageTower(torch.nn.Module):
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+
+            def forward(self, pixel_values):
+                return self.model.get_image_features(pixel_values=pixel_values)
+
+        class TextTower(torch.nn.Module):
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+
+            def forward(self, input_ids, attention_mask):
+                return self.model.get_text_features(input_ids=input_ids, attention_mask=attention_mask)
+
+        model = CLIPModel.from_pretrained(model_name).eval()
+        os.makedirs(directory, exist_ok=True)
+
+        image_size = model.config.vision_config.image_size
+        pixel_values = torch.zeros((1, 3, image_size, image_size))
+        input_ids = torch.ones((1, 8), dtype=torch.long)
+        attention_mask = torch.ones((1, 8), dtype=torch.long)
+
+        with torch.no_grad():
+            torch.onnx.export(
+                ImageTower(model), (pixel_values,), os.path.join(directory, "vision.onnx"),
+                input_names=["pixel_values"], output_names=["image_embeds"],
+                dynamic_axes={"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}},
+                opset_version=17, dynamo=False
+            )
+            torch.onnx.export(
+                TextTower(model), (input_ids, attention_mask), os.path.join(directory, "text.onnx"),
+                input_names=["input_ids", "attention_mask"], output_names=["text_embeds"],
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "sequence"},
+                    "attention_mask": {0: "batch", 1: "sequence"},
+                    "text_embeds": {0: "batch"},
+                },
+                opset_version=17, dynamo=False
+            )
+
+        model.config.save_pretrained(directory)
+        with open(os.path.join(directory, "logit_scale.json"), "w", encoding="utf-8") as f:
+            json.dump({"logit_scale": float(model.logit_scale.detach())}, f)
+
+    def clip_model(self, model_name, device):
+        from transformers import CLIPConfig, CLIPModel, CLIPProcessor
+
+        if self.name == "torch":
+            model = self.load_torch_model(CLIPModel, model_name).to(device)
+            return model, CLIPProcessor.from_pretrained(model_name)
+
+        import onnxruntime as ort
+
+        directory = self._model_dir("clip", model_name)
+        if not os.path.exists(os.path.join(directory, "text.onnx")):
+            self.logger.info(f"Exporting {model_name} to ONNX in {directory}...")
+            self.export_clip(model_name, directory)
+        if self.quantize:
+            self._quantize(directory, ["vision", "text"])
+
+        suffix = "_quantized" if self.quantize else ""
+        sessions = [
+            ort.InferenceSession(
+                os.path.join(directory, f"{tower}{suffix}.onnx"),
+                sess_options=self.session_options(),
+                providers=["CPUExecutionProvider"]
+            )
+            for tower in ("vision", "text")
+        ]
+        with open(os.path.join(directory, "logit_scale.json"), encoding="utf-8") as f:
+            logit_scale = json.load(f)["logit_scale"]
+
+        model = OnnxClipModel(*sessions, CLIPConfig.from_pretrained(directory), logit_scale)
+        return model, CLIPProcessor.from_pretrained(model_name)
+
+
+inference_backend = InferenceBackend()
+
+
+PARITY_TEXTS = [
+    "Sunset hike with the best crew, feeling grateful!",
+    "New skincare routine for teens, link in bio",
+    "Quarterly earnings call recap for investors",
+    "I can't believe they cancelled the show again...",
+]
+
+
+def _text_probabilities(pipe, texts):
+    import torch
+
+    inputs = pipe.tokenizer(texts, return_tensors="pt", padding=True, truncation=True)
+    with torch.inference_mode():
+        logits = pipe.model(**inputs).logits
+    return logits.float().softmax(dim=-1).numpy()
+
+
+def _clip_scores(model, processor, texts, images):
+    import torch
+
+    image_inputs = processor(images=images, return_tensors="pt")
+    text_inputs = processor(text=texts, return_tensors="pt", padding=True, truncation=True)
+    with torch.inference_mode():
+        img_emb = model.get_image_features(pixel_values=image_inputs["pixel_values"])
+        txt_emb = model.get_text_features(input_ids=text_inputs["input_ids"], attention_mask=text_inputs["attention_mask"])
+    img_emb = img_emb / img_emb.norm(dim=-1, keepdim=True)
+    txt_emb = txt_emb / txt_emb.norm(dim=-1, keepdim=True)
+    return (img_emb @ txt_emb.T).float().numpy()
+
+
+def parity(tolerance):
+    from PIL import Image
+    from app.model_registry import model_registry
+
+    names = model_registry.model_names()
+    reference = InferenceBackend()
+    reference.name = "torch"
+    candidate = InferenceBackend()
+    candidate.name = "onnx"
+
+    rng = np.random.default_rng(0)
+    images = [Image.fromarray(rng.integers(0, 256, (224, 224, 3), dtype=np.uint8)) for _ in range(2)]
+
+    drifts = {}
+    for key, task in (("zero_shot", "zero-shot-classification"),
+                      ("sentiment", "sentiment-analysis"),
+                      ("keyphrase", "token-classification")):
+        expected = _text_probabilities(reference.text_pipeline(task, names[key]), PARITY_TEXTS)
+        actual = _text_probabilities(candidate.text_pipeline(task, names[key]), PARITY_TEXTS)
+        drifts[key] = float(np.abs(expected - actual).max())
+
+    expected = _clip_scores(*reference.clip_model(names["clip"], "cpu"), PARITY_TEXTS, images)
+    actual = _clip_scores(*candidate.clip_model(names["clip"], "cpu"), PARITY_TEXTS, images)
+    drifts["clip"] = float(np.abs(expected - actual).max())
+
+    report = {
+        "quantized": candidate.quantize,
+        "tolerance": tolerance,
+        "max_abs_drift": {key: round(value, 5) for key, value in drifts.items()},
+        "passed": all(value <= tolerance for value in drifts.values()),
+    }
+    print(json.dumps(report, indent=2))
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the analyzer models to ONNX and check score drift.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("export", help="Export (and quantize) every model into ONNX_CACHE_DIR.")
+    parity_parser = subparsers.add_parser("parity", help="Compare ONNX scores against the PyTorch models.")
+    parity_parser.add_argument("--tolerance", type=float, default=0.05,
+                               help="Maximum allowed absolute drift of probabilities and CLIP cosines.")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        from app.model_registry import model_registry
+
+        names = model_registry.model_names()
+        backend = InferenceBackend()
+        backend.name = "onnx"
+        backend.text_pipeline("zero-shot-classification", names["zero_shot"])
+        backend.text_pipeline("sentiment-analysis", names["sentiment"])
+        backend.text_pipeline("token-classification", names["keyphrase"])
+        backend.clip_model(names["clip"], "cpu")
+        print(f"ONNX models written to {backend.cache_dir}", file=sys.stderr)
+        return
+
+    if not parity(args.tolerance)["passed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
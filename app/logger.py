@@ -1,47 +1,171 @@
 import os
 import sys
+import copy
+import json
+import queue
+import atexit
 import logging
-from datetime import datetime
+import threading
+import contextvars
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+_fila = queue.SimpleQueue()
+_listener = None
+_lock = threading.Lock()
+
+
+def _raiz_projeto():
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+class _RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class _FilaHandler(QueueHandler):
+    # Message and traceback are rendered on the caller's thread (args may change later);
+    # JSON encoding and file I/O happen on the listener thread.
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        dados = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name.removeprefix("logger_"),
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "thread": record.threadName,
+            "pid": record.process,
+        }
+        if record.exc_text:
+            dados["exception"] = record.exc_text
+        return json.dumps(dados, ensure_ascii=False)
+
+
+class DailyFileHandler(logging.Handler):
+    """Writes to logs/<subpasta>/YYYY-MM-DD.log and switches file when the date changes."""
+
+    def __init__(self, subpasta):
+        super().__init__()
+        self.pasta = os.path.join(_raiz_projeto(), 'logs', subpasta)
+        self.data = None
+        self.stream = None
+
+    def _abrir(self, data):
+        if self.stream is not None:
+            self.stream.close()
+        os.makedirs(self.pasta, exist_ok=True)
+        self.stream = open(os.path.join(self.pasta, f"{data}.log"), "a", encoding="utf-8")
+        self.data = data
+
+    def emit(self, record):
+        try:
+            data = datetime.fromtimestamp(record.created).strftime('%Y-%m-%d')
+            if data != self.data:
+                self._abrir(data)
+            self.stream.write(self.format(record) + "\n")
+            self.stream.flush()
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+        super().close()
+
+
+class _Roteador(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.handlers = {}
+
+    def emit(self, record):
+        handler = self.handlers.get(record.name)
+        if handler is None:
+            handler = DailyFileHandler(record.name.removeprefix("logger_"))
+            handler.setFormatter(JsonFormatter())
+            self.handlers[record.name] = handler
+        handler.handle(record)
+
+    def close(self):
+        for handler in self.handlers.values():
+            handler.close()
+        super().close()
+
+
+def _iniciar_listener():
+    global _listener
+    with _lock:
+        if _listener is None:
+            _listener = QueueListener(_fila, _Roteador())
+            _listener.start()
+
+
+def _reiniciar_no_filho():
+    # The listener thread does not survive fork(); worker processes start their own.
+    global _fila, _listener, _lock
+    _fila = queue.SimpleQueue()
+    _listener = None
+    _lock = threading.Lock()
+    for logger in logging.Logger.manager.loggerDict.values():
+        for handler in getattr(logger, "handlers", []):
+            if isinstance(handler, _FilaHandler):
+                handler.queue = _fila
+    _iniciar_listener()
+
+
+def shutdown_logging():
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+            _listener = None
+
+
+atexit.register(shutdown_logging)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reiniciar_no_filho)
+
 
 class LogManager:
     def __init__(self, subpasta='main'):
         self.subpasta = subpasta
         self.logger = None
-        self.caminho_log = self._criar_caminhos_logs()
         self._configurar_logger()
 
-    def _criar_pasta_logs(self):
-        if getattr(sys, 'frozen', False):
-            raiz_projeto = os.path.dirname(sys.executable)
-        else:
-            raiz_projeto = os.path.dirname(os.path.abspath(__file__))
-        
-        base_dir = os.path.join(raiz_projeto, 'logs')
-        caminho_completo = os.path.join(base_dir, self.subpasta)
-
-        os.makedirs(caminho_completo, exist_ok=True)
-        return caminho_completo
-
-    def _criar_caminhos_logs(self):
-        pasta_logs = self._criar_pasta_logs()
-        data_hoje = datetime.now().strftime('%Y-%m-%d')
-        caminho_log = os.path.join(pasta_logs, f"{data_hoje}.log")
-        return caminho_log
-
     def _configurar_logger(self):
+        _iniciar_listener()
+
         self.logger = logging.getLogger(f'logger_{self.subpasta}')
-        self.logger.setLevel(logging.DEBUG)
+        self.logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+        self.logger.propagate = False
 
         if not self.logger.handlers:
-            formato = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-            handler = logging.FileHandler(self.caminho_log, encoding='utf-8')
-            handler.setFormatter(formato)
+            handler = _FilaHandler(_fila)
+            handler.addFilter(_RequestIdFilter())
             self.logger.addHandler(handler)
 
     def get_logger(self):
         return self.logger
 
     def flush_and_close(self):
-        for handler in self.logger.handlers:
-            handler.flush()
-            handler.close()
+        shutdown_logging()
@@ -1,17 +1,99 @@
-
-
+import os
 import re
-from typing import Dict, List, Any
-from pydantic import BaseModel, Field
+import json
+import time
+import uuid
+import asyncio
+import tempfile
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, List, Any, Optional
+from pydantic import BaseModel, Field, model_validator
+from app.startup import startup_tracker
+from app.batching import batching_stats
+from app.cache import content_hash, feature_cache
 from app.clip_analyser import ClipAnalyzer
-from app.final_results import final_result
+from app.feature_store import feature_store
+from app.final_results import COMPONENTS, extract_components, provisional_result, resolve_weights, score_posts
+from app.hashtag_recommender import HashtagRecommender
 from app.image_analyzer import ImageAnalyzer
+from app.image_loader import ImageLoader, LoadedImage
+from app.media import KeyframeSampler, MediaPost, dedupe
+from app.model_registry import model_registry
+from app.sessions import EditSession, SessionStore
+from app.singleflight import SingleFlight, single_flight_stats
 from app.text_analyzer import TextAnalyzer
-from app.logger import LogManager
-from fastapi import FastAPI, HTTPException
+from app.logger import LogManager, request_id_var
+from app.metrics import DOWNLOAD_BYTES, REQUEST_SECONDS, REQUESTS, profile_report, render_metrics, stage, start_profile
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI()
+clip_analyzer = ClipAnalyzer(models=model_registry)
+text_analyzer = TextAnalyzer(models=model_registry)
+image_analyzer = ImageAnalyzer()
+image_loader = ImageLoader()
+keyframe_sampler = KeyframeSampler()
+hashtag_recommender = HashtagRecommender()
+session_store = SessionStore()
+
+# Identical concurrent requests share one computation, whole posts first, then downloads and model calls.
+post_flights = SingleFlight("post")
+fetch_flights = SingleFlight("fetch")
+text_flights = SingleFlight("text")
+image_flights = SingleFlight("image")
+clip_flights = SingleFlight("clip")
+
+executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("ANALYZER_WORKERS", "16")),
+    thread_name_prefix="analyzer"
+)
+
+bulk_chunk_size = int(os.getenv("BULK_CHUNK_SIZE", "32"))
+carousel_max_images = int(os.getenv("CAROUSEL_MAX_IMAGES", "20"))
+video_max_bytes = int(os.getenv("VIDEO_MAX_BYTES", str(200 * 1024 * 1024)))
+
+logger = LogManager('mainLog').get_logger()
+startup_tracker.mark("imports")
+
+
+def prepare_models():
+    model_registry.warm_up()
+    if text_analyzer.multitask is not None:
+        text_analyzer.multitask.load()
+    startup_tracker.mark("warm_up")
+    clip_analyzer.open_hashtag_index()
+    hashtag_recommender.load()
+    startup_tracker.mark("indexes")
+
+
+async def become_ready():
+    try:
+        await in_executor(prepare_models)
+    except Exception as e:
+        logger.exception(f"Startup failed: {e}")
+        startup_tracker.set_failed(e)
+        return
+    startup_tracker.set_ready()
+    logger.info(f"Ready: {startup_tracker.report(model_registry.load_seconds)}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await image_loader.open()
+    startup_tracker.mark("server")
+    # The server accepts connections (and /health answers) while models load; /ready flips after warm-up.
+    warm_up_task = asyncio.create_task(become_ready())
+    yield
+    warm_up_task.cancel()
+    await image_loader.close()
+    executor.shutdown(wait=False)
+    feature_cache.flush()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,71 +103,745 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def tag_request_id(request: Request, call_next):
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
+def in_executor(func, *args):
+    # run_in_executor does not carry context variables, so the request ID is copied explicitly.
+    context = contextvars.copy_context()
+    return asyncio.get_running_loop().run_in_executor(executor, functools.partial(context.run, func, *args))
+
+
 class AnalyzeRequest(BaseModel):
     text: List[str] = Field(default_factory=list)
-    image_url: str
+    image_url: Optional[str] = None
+    image_urls: List[str] = Field(default_factory=list)
+    video_url: Optional[str] = None
 
+    @model_validator(mode="after")
+    def check_media(self):
+        if sum((self.image_url is not None, bool(self.image_urls), self.video_url is not None)) != 1:
+            raise ValueError("Provide exactly one of image_url, image_urls or video_url.")
+        if len(self.image_urls) > carousel_max_images:
+            raise ValueError(f"A carousel takes at most {carousel_max_images} images.")
+        return self
 
-@app.post("/analyze-post")
-def read_root(req: AnalyzeRequest) -> Dict[str, Any]:
 
-    text_raw = req.text
-    image_path = req.image_url
+class SessionEditRequest(BaseModel):
+    text: List[str] = Field(default_factory=list)
+
+
+@stage("clip")
+def run_clip_analysis(post_text_list, image, labels_hashtag_list):
+    try:
+        logger.info("Starting ClipAnalyzer.analyser()")
+        clip_result = clip_analyzer.analyser(
+            post_text_list=post_text_list,
+            image=image,
+            labels_hashtag_list=labels_hashtag_list
+        )
+        logger.info("ClipAnalyzer.analyser() finished successfully.")
+    except Exception as e:
+        logger.error(f"ClipAnalyzer.analyser() failed: {e}")
+        clip_result = {"error": f"Clip analysis failed: {e}"}
+    return clip_result
+
+
+async def clip_analysis(post_text_list, image, labels_hashtag_list):
+    async def run():
+        return await in_executor(run_clip_analysis, post_text_list, image, labels_hashtag_list), image
+
+    key = (image.content_hash, tuple(post_text_list), tuple(labels_hashtag_list))
+    clip_result, encoded_image = await clip_flights.do(key, run)
+    # A shared call encoded another caller's copy of the image.
+    for frame, encoded_frame in zip(image.frames, encoded_image.frames):
+        if frame.clip_embedding is None:
+            frame.clip_embedding = encoded_frame.clip_embedding
+    return clip_result
+
+
+def text_model_key():
+    model_names = model_registry.model_names()
+    if text_analyzer.multitask is not None:
+        return [["multitask", model_names["sentence"], text_analyzer.multitask.version]]
+    if text_analyzer.audience_classifier is not None:
+        audience_model = [model_names["sentence"], text_analyzer.audience_classifier.version]
+    else:
+        audience_model = model_names["zero_shot"]
+    return [audience_model, model_names["sentiment"], model_names["keyphrase"]]
+
+
+def image_model_key():
+    return [
+        model_registry.model_names()["clip"], image_analyzer.face_detector.backend,
+        [image_loader.decode_max_side, image_loader.decode_min_side]
+    ]
+
+
+def text_cache_key(text):
+    return content_hash(*text_model_key(), text)
+
+
+def image_cache_key(image_hash):
+    return content_hash(*image_model_key(), image_hash)
+
+
+def result_cache_key(image_hash, post_text_list, labels_hashtag_list):
+    return content_hash(
+        text_model_key(), image_model_key(), resolve_weights(), image_hash, post_text_list, sorted(labels_hashtag_list)
+    )
+
+
+@stage("text")
+def run_text_analysis(post_text_list):
+    entries = cached_text_entries(post_text_list)
+    missing = [text for text, entry in entries.items() if entry is None]
+
+    text_result = {"text_analysis": []}
+    if missing:
+        try:
+            logger.info(f"Starting TextAnalyzer.analyser() for {len(missing)} uncached sequences")
+            text_result = text_analyzer.analyser(post_text_list=missing)
+            logger.info("TextAnalyzer.analyser() finished successfully.")
+        except Exception as e:
+            logger.error(f"TextAnalyzer.analyser() failed: {e}")
+            return {"error": f"Text analysis failed: {e}"}
 
-    text_raw = " ".join(req.text) if isinstance(req.text, list) else req.text
+    return collect_text_result(post_text_list, entries, text_result)
+
+
+def text_analysis(post_text_list):
+    return text_flights.do(("analysis", tuple(post_text_list)), in_executor, run_text_analysis, post_text_list)
+
+
+def cache_get(namespace, key):
+    # Only the in-memory tier is read on the event loop; SQLite reads run on the executor.
+    return feature_cache.get_async(namespace, key, run_blocking=in_executor)
+
+
+def cached_text_entries(post_text_list):
+    return {text: feature_cache.get("text", text_cache_key(text)) for text in post_text_list}
+
+
+def collect_text_result(post_text_list, entries, text_result, store=True):
+    if "text_analysis" not in text_result:
+        return text_result
+
+    entries = dict(entries)
+    for entry in text_result["text_analysis"]:
+        entries[entry["sequence"]] = entry
+        if store and {"audience", "sentiment", "key_words", "readability"} <= entry.keys():
+            feature_cache.set("text", text_cache_key(entry["sequence"]), entry)
+
+    return {"text_analysis": [entries[text] for text in post_text_list if entries.get(text)]}
+
+
+@stage("image")
+def run_image_analysis(image):
+    try:
+        logger.info("Starting ImageAnalyzer.analyser()")
+        image_result = image_analyzer.analyser(image=image)
+        logger.info("ImageAnalyzer.analyser() finished successfully.")
+    except Exception as e:
+        logger.error(f"ImageAnalyzer.analyser() failed: {e}")
+        image_result = {"error": f"Image analysis failed: {e}"}
+    return image_result
+
+
+@stage("image")
+def run_image_analysis_batch(images):
+    try:
+        logger.info(f"Starting ImageAnalyzer.analyser_batch() for {len(images)} images")
+        image_results = image_analyzer.analyser_batch(images)
+        logger.info("ImageAnalyzer.analyser_batch() finished successfully.")
+    except Exception as e:
+        logger.error(f"ImageAnalyzer.analyser_batch() failed: {e}")
+        image_results = [{"error": f"Image analysis failed: {e}"}] * len(images)
+    return image_results
+
+
+def parse_post_text(text):
+    text_raw = " ".join(text) if isinstance(text, list) else text
 
     labels_hashtag_list = re.findall(r"#\w+", text_raw)
 
     clean_text = re.sub(r"#\w+", "", text_raw).strip()
     post_text_list = [clean_text] if clean_text else []
 
-    log_manager = LogManager('mainLog')
-    logger = log_manager.get_logger()
+    return post_text_list, labels_hashtag_list
+
+
+async def has_image_features(image_hash):
+    return await cache_get("image", image_cache_key(image_hash)) is not None
 
-    logger.info("Initializing analyzers (ClipAnalyzer, TextAnalyzer, ImageAnalyzer).")
 
+async def apply_cached_image_features(image):
+    features = await cache_get("image", image_cache_key(image.content_hash))
+    if features is None:
+        return None
+
+    image.clip_embedding = features["clip_embedding"]
+    return features["image_result"]
+
+
+def store_image_features(image, image_result):
+    image_analysis = image_result.get("image_analysis")
+    if image.clip_embedding is None or not image_analysis:
+        return
+    if any(isinstance(value, dict) and "error" in value for value in image_analysis.values()):
+        return
+
+    feature_cache.set("image", image_cache_key(image.content_hash), {
+        "clip_embedding": image.clip_embedding,
+        "image_result": image_result
+    })
+
+
+async def load_image(image_url):
+    # Each caller gets its own copy of a shared load: embeddings are set and pixels dropped per request.
+    image, cached_image_result = await fetch_flights.do(("image", image_url), fetch_image, image_url)
+    return image.copy(), cached_image_result
+
+
+async def fetch_image(image_url):
+    logger.info("Loading image.")
     try:
-        clip_analyzer = ClipAnalyzer(
-            post_text_list=post_text_list,
-            image_path=image_path,
-            labels_hashtag_list=labels_hashtag_list
-        )
+        with stage("image.download"):
+            data, image_hash = await image_loader.fetch_async(image_url, is_known=has_image_features, run_blocking=in_executor)
+        image = LoadedImage(data, None, image_hash)
+        cached_image_result = await apply_cached_image_features(image)
+
+        if cached_image_result is None:
+            if data is None:
+                # The cached features were evicted after the ETag check, download the body.
+                with stage("image.download"):
+                    data, image_hash = await image_loader.fetch_async(image_url, run_blocking=in_executor)
+                image = LoadedImage(data, None, image_hash)
+            DOWNLOAD_BYTES.observe(len(data))
+            with stage("image.decode"):
+                image.pixels, image.original_size = await in_executor(image_loader.decode, data)
+            # Only the pixels are needed from here on.
+            image.data = None
     except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to init ClipAnalyzer: {e}")
-    
+        logger.error(f"Image loading failed: {e}")
+        raise HTTPException(status_code=400, detail=f"Failed to load image: {e}")
+
+    return image, cached_image_result
+
+
+async def load_carousel(image_urls):
+    loaded = await asyncio.gather(*(load_image(image_url) for image_url in image_urls))
+    frames = [image for image, _ in loaded]
+    frame_info = [{"index": i} for i in range(len(frames))]
+    size_bytes = sum(image.size_bytes for image in frames)
+    frames, weights, frame_info, frame_results = dedupe(
+        frames, [1.0] * len(frames), frame_info, [result for _, result in loaded], keyframe_sampler.dedupe_distance
+    )
+    carousel_hash = content_hash("carousel", [image.content_hash for image, _ in loaded])
+    return MediaPost("carousel", frames, weights, frame_info, carousel_hash, size_bytes, frame_results), None
+
+
+async def load_video(video_url):
+    media, _ = await fetch_flights.do(("video", video_url), fetch_video, video_url)
+    return media.copy(), None
+
+
+async def fetch_video(video_url):
+    logger.info("Loading video.")
+    fd, path = tempfile.mkstemp(prefix="analyzer_video_")
+    os.close(fd)
     try:
-        text_analyzer = TextAnalyzer(post_text_list=post_text_list)
+        with stage("video.download"):
+            video_hash, size_bytes = await image_loader.download(video_url, path, video_max_bytes, run_blocking=in_executor)
+        DOWNLOAD_BYTES.observe(size_bytes)
+        with stage("video.keyframes"):
+            media = await in_executor(keyframe_sampler.build_post, path, video_hash, size_bytes)
     except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to init TextAnalyzer: {e}")
+        logger.error(f"Video loading failed: {e}")
+        raise HTTPException(status_code=400, detail=f"Failed to load video: {e}")
+    finally:
+        os.remove(path)
+
+    media.frame_results = [apply_cached_image_features(frame) for frame in media.frames]
+    return media, None
+
+
+def load_media(req):
+    if req.video_url is not None:
+        return load_video(req.video_url)
+    if req.image_urls:
+        return load_carousel(req.image_urls)
+    return load_image(req.image_url)
+
+
+def media_key(req):
+    if req.video_url is not None:
+        return ("video", req.video_url)
+    if req.image_urls:
+        return ("carousel", tuple(req.image_urls))
+    return ("image", req.image_url)
+
 
+def suggest_hashtags(image, labels_hashtag_list):
     try:
-        image_analyzer = ImageAnalyzer(image_path=image_path)
+        return hashtag_recommender.search(image.clip_embedding, exclude=labels_hashtag_list)
     except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to init ImageAnalyzer: {e}")
+        logger.error(f"Hashtag suggestion failed: {e}")
+        return []
 
+
+def with_suggestions(result, image, labels_hashtag_list):
+    return {**result, "suggested_hashtags": suggest_hashtags(image, labels_hashtag_list)}
+
+
+async def analyze_image(image, cached_image_result):
+    if cached_image_result is not None:
+        return cached_image_result
+    return await image_flights.do(image.content_hash, compute_image_result, image)
+
+
+async def compute_image_result(image):
+    if isinstance(image, MediaPost):
+        return (await analyze_images([(image, None)]))[0]
+
+    return await in_executor(run_image_analysis, image)
+
+
+def media_frames(image, cached_image_result):
+    if isinstance(image, MediaPost):
+        return list(zip(image.frames, image.frame_results))
+    return [(image, cached_image_result)]
+
+
+async def analyze_images(loaded_images):
+    # Carousel images and video keyframes are analyzed as separate frames in one batch, then folded per post.
+    entries = [media_frames(image, cached_image_result) for image, cached_image_result in loaded_images]
+    missing = [frame for frames in entries for frame, cached_frame_result in frames if cached_frame_result is None]
+    image_results = iter(await in_executor(run_image_analysis_batch, missing) if missing else [])
+
+    results = []
+    for (image, _), frames in zip(loaded_images, entries):
+        frame_results = [cached if cached is not None else next(image_results) for _, cached in frames]
+        results.append(image_analyzer.combine(image, frame_results) if isinstance(image, MediaPost) else frame_results[0])
+    return results
+
+
+def store_media_features(image, image_result):
+    if not isinstance(image, MediaPost):
+        store_image_features(image, image_result)
+        return
+
+    frame_analyses = (image_result.get("image_analysis") or {}).get("frames") or []
+    for frame, cached_frame_result, frame_analysis in zip(image.frames, image.frame_results, frame_analyses):
+        if cached_frame_result is None and "image_analysis" in frame_analysis:
+            store_image_features(frame, {"image_analysis": frame_analysis["image_analysis"]})
+
+
+@stage("clip")
+def run_clip_analysis_batch(items):
     try:
-        logger.info("Starting ClipAnalyzer.analyser()")
-        clip_result = clip_analyzer.analyser()
-        logger.info("ClipAnalyzer.analyser() finished successfully.")
+        logger.info(f"Starting ClipAnalyzer.analyser_batch() for {len(items)} posts")
+        clip_results = clip_analyzer.analyser_batch(items)
+        logger.info("ClipAnalyzer.analyser_batch() finished successfully.")
     except Exception as e:
-        logger.error(f"ClipAnalyzer.analyser() failed: {e}")
-        clip_result = {"error": f"Clip analysis failed: {e}"}
+        logger.error(f"ClipAnalyzer.analyser_batch() failed: {e}")
+        clip_results = [{"error": f"Clip analysis failed: {e}"}] * len(items)
+    return clip_results
+
+
+def split_text_result(text_result, post_text_lists):
+    if "text_analysis" not in text_result:
+        return [text_result] * len(post_text_lists)
+
+    by_sequence = {entry["sequence"]: entry for entry in text_result["text_analysis"]}
+    return [
+        {"text_analysis": [by_sequence[text] for text in post_text_list if text in by_sequence]}
+        for post_text_list in post_text_lists
+    ]
+
+
+async def analyze_chunk(chunk, image_tasks):
+    parsed = [parse_post_text(req.text) for req in chunk]
+    post_text_lists = [post_text_list for post_text_list, _ in parsed]
+    all_texts = list(dict.fromkeys(text for post_text_list in post_text_lists for text in post_text_list))
+
+    text_future = asyncio.ensure_future(text_analysis(all_texts))
+
+    loaded_images = await asyncio.gather(*image_tasks, return_exceptions=True)
+
+    outputs = [None] * len(chunk)
+    pending = []
+    for i, loaded in enumerate(loaded_images):
+        if isinstance(loaded, HTTPException):
+            outputs[i] = {"error": loaded.detail}
+        elif isinstance(loaded, Exception):
+            outputs[i] = {"error": f"Failed to load image: {loaded}"}
+        else:
+            result_key = result_cache_key(loaded[0].content_hash, *parsed[i])
+            cached_result = await cache_get("result", result_key)
+            if cached_result is not None:
+                outputs[i] = {"result": with_suggestions(cached_result, loaded[0], parsed[i][1])}
+            else:
+                pending.append((i, result_key))
+
+    clip_items = [(parsed[i][0], loaded_images[i][0], parsed[i][1]) for i, _ in pending]
+    clip_results, image_results, text_result = await asyncio.gather(
+        in_executor(run_clip_analysis_batch, clip_items),
+        analyze_images([loaded_images[i] for i, _ in pending]),
+        text_future
+    )
+    text_results = split_text_result(text_result, post_text_lists)
+
+    for (i, _), image_result in zip(pending, image_results):
+        image, cached_image_result = loaded_images[i]
+        if cached_image_result is None:
+            store_media_features(image, image_result)
 
     try:
-        logger.info("Starting TextAnalyzer.analyser()")
-        text_result = text_analyzer.analyser()
-        logger.info("TextAnalyzer.analyser() finished successfully.")
+        with stage("final_result"):
+            posts = [
+                extract_components(image_result, text_results[i], clip_result, parsed[i][1])
+                for (i, _), clip_result, image_result in zip(pending, clip_results, image_results)
+            ]
+            results = score_posts(posts)
     except Exception as e:
-        logger.error(f"TextAnalyzer.analyser() failed: {e}")
-        text_result = {"error": f"Text analysis failed: {e}"}
+        logger.error(f"Scoring failed for bulk chunk: {e}")
+        for i, _ in pending:
+            outputs[i] = {"error": f"Scoring failed: {e}"}
+        return outputs
+
+    features = []
+    for (i, result_key), clip_result, post, result in zip(pending, clip_results, posts, results):
+        image = loaded_images[i][0]
+        if "error" not in clip_result and "error" not in text_results[i]:
+            feature_cache.set("result", result_key, result)
+            features.append((result_key, image.content_hash, post))
+        outputs[i] = {"result": with_suggestions(result, image, parsed[i][1])}
+    feature_store.append(features)
+    return outputs
+
+
+async def analyze_post(req):
+    post_text_list, labels_hashtag_list = parse_post_text(req.text)
+    key = (media_key(req), tuple(post_text_list), tuple(sorted(labels_hashtag_list)))
+    return await post_flights.do(key, compute_post, req, post_text_list, labels_hashtag_list)
+
+
+async def compute_post(req, post_text_list, labels_hashtag_list):
+    # Text analysis does not need the image, so it starts while the image downloads.
+    text_future = asyncio.ensure_future(text_analysis(post_text_list))
 
     try:
-        logger.info("Starting ImageAnalyzer.analyser()")
-        image_result = image_analyzer.analyser()
-        logger.info("ImageAnalyzer.analyser() finished successfully.")
-    except Exception as e:
-        logger.error(f"ImageAnalyzer.analyser() failed: {e}")
-        image_result = {"error": f"Image analysis failed: {e}"}
+        image, cached_image_result = await load_media(req)
+    except HTTPException:
+        await asyncio.gather(text_future, return_exceptions=True)
+        raise
+
+    result_key = result_cache_key(image.content_hash, post_text_list, labels_hashtag_list)
+    cached_result = await cache_get("result", result_key)
+    if cached_result is not None:
+        logger.info("Returning cached final result.")
+        return with_suggestions(cached_result, image, labels_hashtag_list)
+
+    clip_result, image_result, text_result = await asyncio.gather(
+        clip_analysis(post_text_list, image, labels_hashtag_list),
+        analyze_image(image, cached_image_result),
+        text_future
+    )
+    return finish_post(image, cached_image_result, image_result, text_result, clip_result, labels_hashtag_list, result_key)
+
+
+def finish_post(image, cached_image_result, image_result, text_result, clip_result, labels_hashtag_list, result_key):
+    if cached_image_result is None:
+        store_media_features(image, image_result)
+
+    with stage("final_result"):
+        post = extract_components(image_result, text_result, clip_result, labels_hashtag_list)
+        result = score_posts([post])[0]
+    if "error" not in clip_result and "error" not in text_result:
+        feature_cache.set("result", result_key, result)
+        feature_store.append([(result_key, image.content_hash, post)])
+    return with_suggestions(result, image, labels_hashtag_list)
+
+
+# Score components each progressive event settles; audience and keyphrase only feed the tips.
+EVENT_COMPONENTS = {
+    "image": {"dimension_quality"},
+    "faces": {"dimension_quality", "faces"},
+    "clip": {"clip_similarity", "hashtag_similarity"},
+    "sentiment": {"sentiment"},
+    "readability": {"readability"},
+    "multitask": {"sentiment"},
+    "audience": set(),
+    "keyphrase": set(),
+}
+
+
+async def analyze_post_events(req):
+    """Yields the analyze_post result in stages: a provisional score, one refinement per finished model, then the final result."""
+    post_text_list, labels_hashtag_list = parse_post_text(req.text)
+    pending = set(COMPONENTS) - {"hashtag_count"}
+    image_result = clip_result = None
+
+    entries = {text: await cache_get("text", text_cache_key(text)) for text in post_text_list}
+    missing = [text for text, entry in entries.items() if entry is None]
+    text_parts = {}
+    tasks = {}
+    if missing:
+        for name in text_analyzer.steps():
+            step = text_flights.do((name, tuple(missing)), in_executor, text_analyzer.run_step, name, missing)
+            tasks[asyncio.ensure_future(step)] = name
+    else:
+        pending -= {"sentiment", "readability"}
+
+    def text_result(store=False):
+        merged = text_analyzer.merge(
+            text_parts.get("audience"), text_parts.get("sentiment"), text_parts.get("keyphrase"), text_parts.get("readability")
+        ) if missing else {"text_analysis": []}
+        return collect_text_result(post_text_list, entries, merged, store)
+
+    def event(name):
+        post = extract_components(image_result, text_result(), clip_result, labels_hashtag_list)
+        return {"event": name, **provisional_result(post, pending)}
+
+    load_task = asyncio.ensure_future(load_media(req))
+    tasks[load_task] = "load"
+    try:
+        yield event("provisional")
+
+        while tasks:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = tasks.pop(task)
+                if name == "load":
+                    try:
+                        image, cached_image_result = task.result()
+                    except HTTPException as e:
+                        yield {"event": "error", "error": e.detail}
+                        return
+
+                    result_key = result_cache_key(image.content_hash, post_text_list, labels_hashtag_list)
+                    cached_result = await cache_get("result", result_key)
+                    if cached_result is not None:
+                        yield {"event": "final", "result": with_suggestions(cached_result, image, labels_hashtag_list)}
+                        return
+
+                    if cached_image_result is not None:
+                        image_result = cached_image_result
+                        pending -= EVENT_COMPONENTS["faces"]
+                    else:
+                        tasks[asyncio.ensure_future(analyze_image(image, None))] = "faces"
+                        if isinstance(image, LoadedImage):
+                            image_result = {"image_analysis": {"image_dimension": image_analyzer.image_dimensions(image)}}
+                            pending -= EVENT_COMPONENTS["image"]
+                    tasks[asyncio.ensure_future(clip_analysis(post_text_list, image, labels_hashtag_list))] = "clip"
+                    name = "image"
+                elif name == "faces":
+                    image_result = task.result()
+                elif name == "clip":
+                    clip_result = task.result()
+                elif name == "multitask":
+                    text_parts["audience"], text_parts["sentiment"], text_parts["keyphrase"] = task.result()
+                else:
+                    text_parts[name] = task.result()
+
+                pending -= EVENT_COMPONENTS[name]
+                yield event(name)
+
+        yield {
+            "event": "final",
+            "result": finish_post(
+                image, cached_image_result, image_result, text_result(store=True), clip_result, labels_hashtag_list, result_key
+            )
+        }
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+@app.post("/analyze-post")
+async def read_root(req: AnalyzeRequest, profile: bool = False) -> Dict[str, Any]:
+    started = time.perf_counter()
+    request_profile = start_profile() if profile else None
+
+    try:
+        result = await analyze_post(req)
+    except Exception:
+        REQUESTS.labels("analyze-post", "error").inc()
+        raise
+    finally:
+        REQUEST_SECONDS.labels("analyze-post").observe(time.perf_counter() - started)
+
+    REQUESTS.labels("analyze-post", "ok").inc()
+    if request_profile is not None:
+        request_profile["total"] = round((time.perf_counter() - started) * 1000.0, 3)
+        result = {**result, "profile": profile_report(request_profile)}
+    return result
+
+
+@app.post("/analyze-post/stream")
+async def stream_post(req: AnalyzeRequest) -> StreamingResponse:
+
+    async def stream_events():
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            async for post_event in analyze_post_events(req):
+                if post_event["event"] == "final":
+                    outcome = "ok"
+                yield json.dumps(post_event) + "\n"
+        finally:
+            REQUESTS.labels("analyze-post-stream", outcome).inc()
+            REQUEST_SECONDS.labels("analyze-post-stream").observe(time.perf_counter() - started)
+
+    return StreamingResponse(stream_events(), media_type="application/x-ndjson")
+
+
+async def score_session(session, text):
+    # Only text-dependent work runs here: the image result and CLIP image embedding are pinned in the session.
+    post_text_list, labels_hashtag_list = parse_post_text(text)
+    result_key = result_cache_key(session.image.content_hash, post_text_list, labels_hashtag_list)
+    cached_result = await cache_get("result", result_key)
+    if cached_result is not None:
+        return with_suggestions(cached_result, session.image, labels_hashtag_list)
+
+    clip_result, text_result = await asyncio.gather(
+        clip_analysis(post_text_list, session.image, labels_hashtag_list),
+        text_analysis(post_text_list)
+    )
+    with stage("final_result"):
+        post = extract_components(session.image_result, text_result, clip_result, labels_hashtag_list)
+        result = score_posts([post])[0]
+    if "error" not in clip_result and "error" not in text_result:
+        feature_cache.set("result", result_key, result)
+    return with_suggestions(result, session.image, labels_hashtag_list)
+
+
+@app.post("/sessions")
+async def create_session(req: AnalyzeRequest) -> Dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        image, cached_image_result = await load_media(req)
+        image_result, _ = await asyncio.gather(
+            analyze_image(image, cached_image_result),
+            in_executor(clip_analyzer.image_embedding, image)
+        )
+        if cached_image_result is None:
+            store_media_features(image, image_result)
+        # The session keeps embeddings and results; decoded pixels are not needed for text edits.
+        for frame in image.frames:
+            frame.pixels = None
+
+        session = session_store.add(EditSession(image, image_result))
+        result = await score_session(session, req.text)
+    except Exception:
+        REQUESTS.labels("sessions", "error").inc()
+        raise
+    finally:
+        REQUEST_SECONDS.labels("sessions").observe(time.perf_counter() - started)
+
+    REQUESTS.labels("sessions", "ok").inc()
+    return {"session_id": session.id, "text": req.text, "result": result}
+
+
+@app.post("/sessions/{session_id}/edits")
+async def edit_session(session_id: str, req: SessionEditRequest) -> Dict[str, Any]:
+    session = session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session.")
+
+    started = time.perf_counter()
+    try:
+        edited = await session_store.edit(session, req.text, score_session)
+    except Exception:
+        REQUESTS.labels("sessions-edit", "error").inc()
+        raise
+    finally:
+        REQUEST_SECONDS.labels("sessions-edit").observe(time.perf_counter() - started)
+
+    REQUESTS.labels("sessions-edit", "ok").inc()
+    return {"session_id": session.id, **edited}
+
+
+@app.delete("/sessions/{session_id}")
+def close_session(session_id: str) -> Dict[str, Any]:
+    if not session_store.remove(session_id):
+        raise HTTPException(status_code=404, detail="Unknown or expired session.")
+    return {"status": "closed"}
+
+
+@app.post("/analyze-posts")
+async def analyze_posts(reqs: List[AnalyzeRequest]) -> StreamingResponse:
+
+    async def stream_results():
+        chunks = [reqs[start:start + bulk_chunk_size] for start in range(0, len(reqs), bulk_chunk_size)]
+
+        def start_fetches(chunk):
+            return [asyncio.create_task(load_media(req)) for req in chunk]
+
+        # Images are fetched one chunk ahead so downloads overlap with inference
+        # without holding every decoded image of the campaign in memory.
+        started = time.perf_counter()
+        next_tasks = start_fetches(chunks[0]) if chunks else []
+        index = 0
+        try:
+            for position, chunk in enumerate(chunks):
+                image_tasks = next_tasks
+                next_tasks = start_fetches(chunks[position + 1]) if position + 1 < len(chunks) else []
+
+                for output in await analyze_chunk(chunk, image_tasks):
+                    yield json.dumps({"index": index, **output}) + "\n"
+                    index += 1
+        finally:
+            for task in next_tasks:
+                task.cancel()
+            REQUESTS.labels("analyze-posts", "ok" if index == len(reqs) else "error").inc()
+            REQUEST_SECONDS.labels("analyze-posts").observe(time.perf_counter() - started)
+
+    logger.info(f"Starting bulk analysis of {len(reqs)} posts.")
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
+@app.get("/stats/batching")
+def read_batching_stats() -> Dict[str, Any]:
+    return batching_stats()
+
+
+@app.get("/stats/single-flight")
+def read_single_flight_stats() -> Dict[str, Any]:
+    return single_flight_stats()
+
+
+@app.get("/stats/cache")
+def read_cache_stats() -> Dict[str, Any]:
+    return feature_cache.stats()
+
+
+@app.get("/health")
+def read_health() -> Dict[str, Any]:
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+def read_ready() -> Response:
+    report = startup_tracker.report(model_registry.load_seconds)
+    return Response(
+        content=json.dumps(report),
+        media_type="application/json",
+        status_code=200 if startup_tracker.ready else 503
+    )
 
-    return final_result(image_result, text_result, clip_result, labels_hashtag_list)
 
+@app.get("/metrics")
+def read_metrics() -> Response:
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
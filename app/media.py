@@ -0,0 +1,174 @@
+import os
+import copy
+
+import cv2
+import numpy as np
+
+from app.cache import content_hash
+from app.image_loader import LoadedImage
+from app.logger import LogManager
+
+
+def frame_signature(pixels):
+    # 64-bit difference hash: robust to re-encoding and small shifts, cheap enough for every frame.
+    gray = cv2.cvtColor(pixels, cv2.COLOR_RGB2GRAY)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    return np.packbits(small[:, 1:] > small[:, :-1])
+
+
+def signature_distance(a, b):
+    return int(np.unpackbits(a ^ b).sum())
+
+
+class MediaPost:
+    """Carousel images or video keyframes analyzed as one post, in place of a single LoadedImage."""
+
+    def __init__(self, kind, frames, weights, frame_info, content_hash, size_bytes, frame_results=None):
+        self.kind = kind
+        self.frames = frames
+        self.weights = np.asarray(weights, dtype=np.float32) / float(sum(weights))
+        self.frame_info = [{**info, "weight": round(float(weight), 3)} for info, weight in zip(frame_info, self.weights)]
+        self.content_hash = content_hash
+        self.size_bytes = size_bytes
+        # Cached image results per frame; None for frames that still need face detection.
+        self.frame_results = frame_results or [None] * len(frames)
+
+    @property
+    def clip_embedding(self):
+        if any(frame.clip_embedding is None for frame in self.frames):
+            return None
+        # Left unnormalized: its cosine with a text is the weighted mean of the per-frame cosines.
+        return (self.weights @ np.stack([frame.clip_embedding for frame in self.frames])).astype(np.float32)
+
+    def copy(self):
+        media = copy.copy(self)
+        media.frames = [frame.copy() for frame in self.frames]
+        return media
+
+
+def dedupe(frames, weights, frame_info, frame_results, max_distance):
+    """Merges identical and near-identical frames into the first one seen, adding up their weights."""
+    kept = []
+    signatures = {}
+    for i, frame in enumerate(frames):
+        if frame.pixels is not None:
+            signatures[i] = frame_signature(frame.pixels)
+        match = next(
+            (
+                k for k in kept
+                if frames[k].content_hash == frame.content_hash
+                or (i in signatures and k in signatures and signature_distance(signatures[i], signatures[k]) <= max_distance)
+            ),
+            None
+        )
+        if match is None:
+            kept.append(i)
+        else:
+            weights[match] += weights[i]
+            frame_info[match].setdefault("duplicates", []).append(frame_info[i].get("index", i))
+
+    return (
+        [frames[k] for k in kept],
+        [weights[k] for k in kept],
+        [frame_info[k] for k in kept],
+        [frame_results[k] for k in kept],
+    )
+
+
+class KeyframeSampler:
+    def __init__(self):
+
+        log_manager = LogManager('keyframeSampler')
+        self.logger = log_manager.get_logger()
+
+        self.sample_fps = float(os.getenv("VIDEO_SAMPLE_FPS", "2"))
+        self.scene_threshold = float(os.getenv("VIDEO_SCENE_THRESHOLD", "0.12"))
+        self.max_frames = int(os.getenv("VIDEO_MAX_FRAMES", "16"))
+        self.max_seconds = float(os.getenv("VIDEO_MAX_SECONDS", "300"))
+        self.dedupe_distance = int(os.getenv("FRAME_DEDUP_DISTANCE", "6"))
+        self.max_side = int(os.getenv("IMAGE_DECODE_MAX_SIDE", os.getenv("FACE_DETECTION_MAX_SIDE", "640")))
+
+    @property
+    def settings(self):
+        return [self.sample_fps, self.scene_threshold, self.max_frames, self.max_seconds, self.dedupe_distance, self.max_side]
+
+    def _thumbnail(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+    def _difference(self, a, b):
+        return float(np.abs(a - b).mean()) / 255.0
+
+    def _keep(self, frame):
+        height, width = frame.shape[:2]
+        scale = self.max_side / max(height, width) if self.max_side > 0 else 1.0
+        if scale < 1.0:
+            frame = cv2.resize(frame, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=frame)
+        return frame
+
+    def _compact(self, keyframes):
+        # Folds the two most alike neighbouring scenes together until the frame budget is met.
+        while len(keyframes) > self.max_frames:
+            i = min(range(len(keyframes) - 1), key=lambda j: self._difference(keyframes[j]["thumb"], keyframes[j + 1]["thumb"]))
+            first, second = keyframes[i], keyframes[i + 1]
+            keep = first if first["samples"] >= second["samples"] else second
+            keyframes[i] = {**keep, "samples": first["samples"] + second["samples"]}
+            del keyframes[i + 1]
+
+    def sample(self, path):
+        """Returns scene keyframes (RGB, downscaled) with the number of samples each one stands for, and the frame size."""
+        capture = cv2.VideoCapture(path)
+        if not capture.isOpened():
+            raise ValueError("Could not open video data.")
+
+        try:
+            fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+            stride = max(1, round(fps / self.sample_fps))
+            keyframes = []
+            size = None
+            index = 0
+            while index / fps <= self.max_seconds:
+                if index % stride:
+                    if not capture.grab():
+                        break
+                    index += 1
+                    continue
+
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                if size is None:
+                    size = (frame.shape[1], frame.shape[0])
+
+                thumb = self._thumbnail(frame)
+                if keyframes and self._difference(thumb, keyframes[-1]["thumb"]) <= self.scene_threshold:
+                    keyframes[-1]["samples"] += 1
+                else:
+                    keyframes.append({"pixels": self._keep(frame), "thumb": thumb, "index": index, "timestamp": round(index / fps, 3), "samples": 1})
+                    if len(keyframes) > 2 * self.max_frames:
+                        self._compact(keyframes)
+                index += 1
+        finally:
+            capture.release()
+
+        if not keyframes:
+            raise ValueError("Video has no decodable frames.")
+
+        self._compact(keyframes)
+        self.logger.info(f"Sampled {index} frames into {len(keyframes)} keyframes.")
+        return keyframes, size
+
+    def build_post(self, path, video_hash, size_bytes):
+        keyframes, size = self.sample(path)
+        frames = [
+            LoadedImage(None, keyframe["pixels"], content_hash(video_hash, keyframe["index"]), size)
+            for keyframe in keyframes
+        ]
+        frame_info = [{"index": keyframe["index"], "timestamp": keyframe["timestamp"]} for keyframe in keyframes]
+        frames, weights, frame_info, frame_results = dedupe(
+            frames, [keyframe["samples"] for keyframe in keyframes], frame_info, [None] * len(frames), self.dedupe_distance
+        )
+        return MediaPost(
+            "video", frames, weights, frame_info, content_hash("video", video_hash, self.settings), size_bytes, frame_results
+        )
@@ -0,0 +1,116 @@
+import os
+import sys
+import time
+import resource
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STAGE_SECONDS = Histogram(
+    "analyzer_stage_seconds", "Wall time spent in each analysis stage.", ["stage"], buckets=LATENCY_BUCKETS
+)
+MODEL_FORWARD_SECONDS = Histogram(
+    "analyzer_model_forward_seconds", "Wall time of one batched model call.", ["model"], buckets=LATENCY_BUCKETS
+)
+BATCH_SIZE = Histogram(
+    "analyzer_batch_size", "Number of inputs per batched model call.", ["model"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+DOWNLOAD_BYTES = Histogram(
+    "analyzer_image_download_bytes", "Size of downloaded post images.",
+    buckets=(16e3, 64e3, 256e3, 1e6, 4e6, 16e6, 64e6)
+)
+REQUEST_SECONDS = Histogram(
+    "analyzer_request_seconds", "End-to-end latency per endpoint.", ["endpoint"], buckets=LATENCY_BUCKETS
+)
+REQUESTS = Counter("analyzer_requests", "Requests handled per endpoint and outcome.", ["endpoint", "outcome"])
+# multiprocess_mode only applies when PROMETHEUS_MULTIPROC_DIR is set (see app/serve.py).
+PEAK_RSS_BYTES = Gauge(
+    "analyzer_peak_rss_bytes", "Peak resident set size of this process.", multiprocess_mode="liveall"
+)
+CUDA_PEAK_BYTES = Gauge(
+    "analyzer_cuda_peak_allocated_bytes", "Peak CUDA memory allocated by PyTorch.", multiprocess_mode="liveall"
+)
+SESSION_EDITS = Counter(
+    "analyzer_session_edits", "Caption edits per outcome: scored, or coalesced into a newer edit.", ["outcome"]
+)
+ACTIVE_SESSIONS = Gauge(
+    "analyzer_active_sessions", "Open caption-editing sessions.", multiprocess_mode="livesum"
+)
+SINGLE_FLIGHT_CALLS = Counter(
+    "analyzer_single_flight_calls", "Coalescable calls per level: executed, or shared with an identical in-flight call.",
+    ["level", "outcome"]
+)
+SINGLE_FLIGHT_SAVED_SECONDS = Counter(
+    "analyzer_single_flight_saved_seconds", "Run time of shared calls multiplied by the callers that shared them.", ["level"]
+)
+STARTUP_SECONDS = Gauge(
+    "analyzer_startup_seconds", "Seconds from the first app import until each startup phase finished.", ["phase"],
+    multiprocess_mode="liveall"
+)
+
+_profile_var = contextvars.ContextVar("profile", default=None)
+_profile_lock = threading.Lock()
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def start_profile():
+    profile = {}
+    _profile_var.set(profile)
+    return profile
+
+
+def current_profile():
+    return _profile_var.get()
+
+
+def record(name, seconds, profile=None):
+    profile = profile if profile is not None else _profile_var.get()
+    if profile is None:
+        return
+    with _profile_lock:
+        profile[name] = round(profile.get(name, 0.0) + seconds * 1000.0, 3)
+
+
+@contextmanager
+def stage(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.labels(name).observe(elapsed)
+        record(name, elapsed)
+
+
+def profile_report(profile):
+    return {
+        "stages_ms": dict(sorted(profile.items())),
+        "peak_rss_bytes": peak_rss_bytes(),
+    }
+
+
+def render_metrics():
+    PEAK_RSS_BYTES.set(peak_rss_bytes())
+    if "torch" in sys.modules:
+        import torch
+        if torch.cuda.is_available():
+            CUDA_PEAK_BYTES.set(torch.cuda.max_memory_allocated())
+
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        # Aggregates the metric files written by every worker, not just the one serving this scrape.
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
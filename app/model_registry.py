@@ -0,0 +1,180 @@
+import os
+import sys
+import time
+import argparse
+import threading
+
+from app.inference_backend import inference_backend
+from app.logger import LogManager
+
+
+class ModelRegistry:
+    def __init__(self):
+
+        log_manager = LogManager('modelRegistry')
+        self.logger = log_manager.get_logger()
+
+        self.backend = inference_backend
+        self.audience_mode = os.getenv("AUDIENCE_CLASSIFIER", "zero-shot").lower()
+        if self.audience_mode not in ("zero-shot", "embedding"):
+            raise ValueError(f"Unknown AUDIENCE_CLASSIFIER '{self.audience_mode}', expected 'zero-shot' or 'embedding'.")
+        self.text_engine = os.getenv("TEXT_ENGINE", "pipelines").lower()
+        if self.text_engine not in ("pipelines", "multitask"):
+            raise ValueError(f"Unknown TEXT_ENGINE '{self.text_engine}', expected 'pipelines' or 'multitask'.")
+
+        self.snapshot_dir = os.getenv("MODEL_SNAPSHOT_DIR", "")
+        if self.snapshot_dir:
+            # Read by huggingface_hub on import, so it has to be set before transformers is loaded.
+            os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+        self.load_seconds = {}
+        self._device = None
+        self._models = {}
+        self._load_lock = threading.Lock()
+
+    @property
+    def device(self):
+        if self._device is None:
+            import torch
+            self._device = "cuda" if torch.cuda.is_available() and self.backend.name == "torch" else "cpu"
+        return self._device
+
+    def _get_or_load(self, key, loader):
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        # One load at a time: transformers resolves its lazy submodules on first use, which is not
+        # thread-safe now that nothing imports it up front.
+        with self._load_lock:
+            if key not in self._models:
+                self.logger.info(f"Loading model {key[1]} for {key[0]}...")
+                started = time.perf_counter()
+                self._models[key] = loader()
+                self.load_seconds[key[0]] = round(time.perf_counter() - started, 3)
+                self.logger.info(f"Model {key[1]} loaded in {self.load_seconds[key[0]]}s.")
+            return self._models[key]
+
+    def model_names(self):
+        return {
+            "zero_shot": os.getenv("ZERO_SHOT_MODEL", "facebook/bart-large-mnli"),
+            "sentiment": os.getenv("SENTIMENT_MODEL", "finiteautomata/bertweet-base-sentiment-analysis"),
+            "keyphrase": os.getenv("KEYPHRASE_MODEL", "ml6team/keyphrase-extraction-kbir-inspec"),
+            "clip": os.getenv("CLIP_MODEL", "openai/clip-vit-base-patch32"),
+            "sentence": os.getenv("AUDIENCE_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"),
+        }
+
+    def required_models(self):
+        names = self.model_names()
+        if self.text_engine == "multitask":
+            return {key: names[key] for key in ("sentence", "clip")}
+        audience = "sentence" if self.audience_mode == "embedding" else "zero_shot"
+        return {key: names[key] for key in (audience, "sentiment", "keyphrase", "clip")}
+
+    def snapshot_path(self, model_name):
+        return os.path.join(self.snapshot_dir, model_name.replace("/", "--"))
+
+    def resolve(self, model_name):
+        if self.snapshot_dir and os.path.isdir(self.snapshot_path(model_name)):
+            return self.snapshot_path(model_name)
+        return model_name
+
+    def zero_shot_classifier(self):
+        model_name = self.model_names()["zero_shot"]
+        return self._get_or_load(
+            ("zero-shot-classification", model_name),
+            lambda: self.backend.text_pipeline("zero-shot-classification", self.resolve(model_name))
+        )
+
+    def sentiment_classifier(self):
+        model_name = self.model_names()["sentiment"]
+        return self._get_or_load(
+            ("sentiment-analysis", model_name),
+            lambda: self.backend.text_pipeline("sentiment-analysis", self.resolve(model_name))
+        )
+
+    def keyphrase_extractor(self):
+        model_name = self.model_names()["keyphrase"]
+        return self._get_or_load(
+            ("token-classification", model_name),
+            lambda: self.backend.text_pipeline(
+                "token-classification", self.resolve(model_name), aggregation_strategy="simple"
+            )
+        )
+
+    def sentence_encoder(self):
+        model_name = self.model_names()["sentence"]
+
+        def load():
+            from transformers import AutoModel, AutoTokenizer
+
+            path = self.resolve(model_name)
+            model = self.backend.load_torch_model(AutoModel, path).to(self.device)
+            return AutoTokenizer.from_pretrained(path), model
+
+        return self._get_or_load(("sentence-embedding", model_name), load)
+
+    def clip_model(self):
+        model_name = self.model_names()["clip"]
+        return self._get_or_load(
+            ("clip", model_name),
+            lambda: self.backend.clip_model(self.resolve(model_name), self.device)
+        )
+
+    def warm_up(self):
+        import torch
+        from PIL import Image
+
+        self.logger.info(f"Warming up models on the {self.backend.name} backend...")
+        sample_text = ["warm up"]
+        sample_image = Image.new("RGB", (224, 224))
+
+        if self.audience_mode == "embedding" or self.text_engine == "multitask":
+            tokenizer, model = self.sentence_encoder()
+            with torch.no_grad():
+                model(**tokenizer(sample_text, return_tensors="pt").to(self.device))
+        if self.text_engine == "pipelines":
+            if self.audience_mode != "embedding":
+                self.zero_shot_classifier()(sample_text, candidate_labels=["general audience"])
+            self.sentiment_classifier()(sample_text)
+            self.keyphrase_extractor()(sample_text)
+
+        model, processor = self.clip_model()
+        inputs = processor(text=sample_text, images=[sample_image], return_tensors="pt", padding=True).to(self.device)
+        with torch.no_grad():
+            model.get_image_features(pixel_values=inputs["pixel_values"])
+            model.get_text_features(input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"])
+
+        self.logger.info("Models warmed up.")
+
+    def download_snapshots(self, directory):
+        from huggingface_hub import snapshot_download
+
+        for key, model_name in self.required_models().items():
+            target = os.path.join(directory, model_name.replace("/", "--"))
+            print(f"Downloading {model_name} ({key}) to {target}...", file=sys.stderr)
+            snapshot_download(
+                repo_id=model_name,
+                local_dir=target,
+                ignore_patterns=["*.h5", "*.msgpack", "*.ot", "tf_model*", "flax_model*", "rust_model*", "onnx/*"]
+            )
+
+
+model_registry = ModelRegistry()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Download the configured models into MODEL_SNAPSHOT_DIR.")
+    parser.add_argument("command", choices=["snapshot"])
+    parser.add_argument("--dir", default=None, help="Snapshot directory (defaults to MODEL_SNAPSHOT_DIR).")
+    args = parser.parse_args(argv)
+
+    directory = args.dir or model_registry.snapshot_dir
+    if not directory:
+        parser.error("set MODEL_SNAPSHOT_DIR or pass --dir")
+    model_registry.download_snapshots(directory)
+    print(f"Snapshots written to {directory}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
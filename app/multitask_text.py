@@ -0,0 +1,320 @@
+import os
+import sys
+import json
+import time
+import threading
+
+import numpy as np
+
+from app.audience_classifier import (
+    AUDIENCE_LABELS, _agreement, _softmax, audience_targets, distillation_main, fit_head, holdout_split, save_head
+)
+from app.logger import LogManager
+
+# Per-token keyphrase tags: outside, first token of a phrase, continuation.
+KEYPHRASE_TAGS = ["O", "B", "I"]
+
+HEADS = ("audience", "sentiment", "keyphrase")
+
+
+def _normalize(values):
+    return values / np.linalg.norm(values, axis=-1, keepdims=True).clip(min=1e-12)
+
+
+class MultiTaskTextEngine:
+    """Audience, sentiment and keyphrase heads on top of a single sentence-encoder pass."""
+
+    def __init__(self, models, head_path=None):
+
+        log_manager = LogManager('multitaskText')
+        self.logger = log_manager.get_logger()
+
+        self.models = models
+        self.head_path = head_path if head_path is not None else os.getenv(
+            "TEXT_MULTITASK_HEAD_PATH",
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "multitask_head.npz")
+        )
+
+        self.sentiment_labels = None
+        self._heads = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        if self.head_path and os.path.exists(self.head_path):
+            return f"head:{self.head_path}:{os.path.getmtime(self.head_path)}"
+        return "untrained"
+
+    def encode(self, texts):
+        """Returns pooled sentence embeddings plus per-token states, offsets and a mask of real tokens."""
+        import torch
+
+        tokenizer, model = self.models.sentence_encoder()
+        inputs = tokenizer(
+            texts, return_tensors="pt", padding=True, truncation=True, max_length=128, return_offsets_mapping=True
+        )
+        offsets = inputs.pop("offset_mapping").numpy()
+        inputs = inputs.to(self.models.device)
+        with torch.inference_mode():
+            hidden = model(**inputs).last_hidden_state
+
+        mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+
+        # Special and padding tokens have empty offsets and never belong to a keyphrase.
+        token_mask = (offsets[..., 1] > offsets[..., 0]) & inputs["attention_mask"].bool().cpu().numpy()
+        return (
+            _normalize(pooled.float().cpu().numpy()),
+            _normalize(hidden.float().cpu().numpy()),
+            offsets,
+            token_mask,
+        )
+
+    def set_heads(self, heads, sentiment_labels):
+        self._heads = {name: (weights.astype(np.float32), bias.astype(np.float32)) for name, (weights, bias) in heads.items()}
+        self.sentiment_labels = [str(label) for label in sentiment_labels]
+
+    def load(self):
+        if self._heads is not None:
+            return
+
+        with self._lock:
+            if self._heads is not None:
+                return
+
+            if not self.head_path or not os.path.exists(self.head_path):
+                raise FileNotFoundError(
+                    f"No multi-task text head at {self.head_path}; train one with `python -m app.multitask_text captions.txt`."
+                )
+            head = np.load(self.head_path)
+            if list(head["audience_labels"]) != AUDIENCE_LABELS:
+                raise ValueError(f"Multi-task text head at {self.head_path} was trained for different audience labels.")
+            if str(head["encoder"]) != self.models.model_names()["sentence"]:
+                raise ValueError(f"Multi-task text head at {self.head_path} was trained on {head['encoder']}, not the configured encoder.")
+            self.set_heads(
+                {name: (head[f"{name}_weights"], head[f"{name}_bias"]) for name in HEADS},
+                head["sentiment_labels"]
+            )
+            self.logger.info(f"Loaded multi-task text heads from {self.head_path}.")
+
+    def _head(self, name, features):
+        weights, bias = self._heads[name]
+        return _softmax(features @ weights.T + bias)
+
+    def keyphrases(self, text, probabilities, offsets, token_mask):
+        tags = probabilities.argmax(axis=-1)
+        spans = []
+        for i in np.flatnonzero(token_mask):
+            tag = KEYPHRASE_TAGS[tags[i]]
+            if tag == "O":
+                continue
+            start, end = (int(value) for value in offsets[i])
+            if tag == "I" and spans and spans[-1]["last"] == i - 1:
+                spans[-1].update(end=end, last=i)
+                spans[-1]["scores"].append(probabilities[i, tags[i]])
+            else:
+                spans.append({"start": start, "end": end, "last": i, "scores": [probabilities[i, tags[i]]]})
+
+        key_words = []
+        for span in spans:
+            # Subword predictions are widened to whole words, as the pipeline's "simple" aggregation reports them.
+            start, end = span["start"], span["end"]
+            while start > 0 and text[start - 1].isalnum():
+                start -= 1
+            while end < len(text) and text[end].isalnum():
+                end += 1
+            if key_words and start < key_words[-1]["end"]:
+                key_words[-1]["end"] = max(end, key_words[-1]["end"])
+                key_words[-1]["scores"].extend(span["scores"])
+            else:
+                key_words.append({"start": start, "end": end, "scores": span["scores"]})
+
+        return [
+            {
+                "entity_group": "KEY",
+                "word": text[item["start"]:item["end"]],
+                "score": float(np.mean(item["scores"])),
+                "start": item["start"],
+                "end": item["end"],
+            }
+            for item in key_words
+        ]
+
+    def __call__(self, texts):
+        """Returns, per text, the same raw outputs as the zero-shot, sentiment and keyphrase pipelines."""
+        if not texts:
+            return []
+
+        self.load()
+        pooled, tokens, offsets, token_mask = self.encode(texts)
+        audience = self._head("audience", pooled)
+        sentiment = self._head("sentiment", pooled)
+        keyphrase = self._head("keyphrase", tokens)
+
+        results = []
+        for i, text in enumerate(texts):
+            order = np.argsort(-audience[i])
+            results.append({
+                "audience": {
+                    "sequence": text,
+                    "labels": [AUDIENCE_LABELS[j] for j in order],
+                    "scores": [float(audience[i, j]) for j in order],
+                },
+                "sentiment": {
+                    "label": self.sentiment_labels[int(sentiment[i].argmax())],
+                    "score": float(sentiment[i].max()),
+                },
+                "key_words": self.keyphrases(text, keyphrase[i], offsets[i], token_mask[i]),
+            })
+        return results
+
+
+def keyphrase_tags(spans, offsets):
+    """Tags real (non-special) tokens from the character spans of the teacher's keyphrases."""
+    tags = np.zeros(len(offsets), dtype=np.int64)
+    for start, end in spans:
+        inside = [i for i, (token_start, token_end) in enumerate(offsets) if token_start < end and token_end > start]
+        if inside:
+            tags[inside[0]] = KEYPHRASE_TAGS.index("B")
+            tags[inside[1:]] = KEYPHRASE_TAGS.index("I")
+    return tags
+
+
+def _span(text, item):
+    if item.get("start") is not None and item.get("end") is not None:
+        return int(item["start"]), int(item["end"])
+    word = (item.get("word") or "").strip()
+    start = text.find(word) if word else -1
+    return (start, start + len(word)) if start >= 0 else None
+
+
+def _keyphrase_agreement(teacher, student):
+    matched = predicted = expected = 0
+    for teacher_words, student_words in zip(teacher, student):
+        teacher_words, student_words = set(teacher_words), set(student_words)
+        matched += len(teacher_words & student_words)
+        predicted += len(student_words)
+        expected += len(teacher_words)
+    precision = matched / predicted if predicted else 1.0
+    recall = matched / expected if expected else 1.0
+    return {
+        "precision": round(precision, 4),
+        "recall": round(recall, 4),
+        "f1": round(2 * precision * recall / (precision + recall), 4) if precision + recall else 0.0,
+    }
+
+
+def _words(key_words):
+    return [(item.get("word") or "").strip().lower() for item in key_words if (item.get("word") or "").strip()]
+
+
+def distill(captions, out_path, holdout=0.2, batch_size=32):
+    from app.model_registry import model_registry
+
+    engine = MultiTaskTextEngine(model_registry, head_path="")
+    zero_shot = model_registry.zero_shot_classifier()
+    sentiment = model_registry.sentiment_classifier()
+    keyphrase = model_registry.keyphrase_extractor()
+    config = sentiment.model.config
+    sentiment_labels = [config.id2label[i] for i in range(len(config.id2label))]
+
+    teacher = {"audience": [], "sentiment": [], "key_words": []}
+    features = {"pooled": [], "tokens": [], "offsets": []}
+    teacher_seconds = 0.0
+    for start in range(0, len(captions), batch_size):
+        batch = captions[start:start + batch_size]
+
+        started = time.perf_counter()
+        teacher["audience"].extend(audience_targets(zero_shot, batch))
+        sentiments = sentiment(batch, top_k=None, batch_size=len(batch))
+        key_words = keyphrase(batch, batch_size=len(batch))
+        teacher_seconds += time.perf_counter() - started
+
+        teacher["sentiment"].extend(
+            [{item["label"]: item["score"] for item in scores}[label] for label in sentiment_labels] for scores in sentiments
+        )
+        teacher["key_words"].extend(key_words)
+
+        pooled, tokens, offsets, token_mask = engine.encode(batch)
+        features["pooled"].append(pooled)
+        for i in range(len(batch)):
+            features["tokens"].append(tokens[i][token_mask[i]])
+            features["offsets"].append(offsets[i][token_mask[i]])
+        print(f"Scored {min(start + batch_size, len(captions))}/{len(captions)} captions", file=sys.stderr)
+
+    teacher_audience = np.asarray(teacher["audience"], dtype=np.float32)
+    teacher_sentiment = np.asarray(teacher["sentiment"], dtype=np.float32)
+    pooled = np.concatenate(features["pooled"])
+
+    train, test = holdout_split(len(captions), holdout)
+
+    tags = [
+        keyphrase_tags(
+            [span for span in (_span(captions[i], item) for item in teacher["key_words"][i]) if span],
+            features["offsets"][i]
+        )
+        for i in range(len(captions))
+    ]
+    train_tokens = np.concatenate([features["tokens"][i] for i in train])
+    train_tags = np.concatenate([tags[i] for i in train])
+    # Most tokens are outside any keyphrase; weighting the tags equally keeps the head from predicting only "O".
+    counts = np.bincount(train_tags, minlength=len(KEYPHRASE_TAGS)).clip(min=1)
+    dimension = pooled.shape[1]
+
+    heads = {
+        "audience": fit_head(pooled[train], teacher_audience[train], np.zeros((len(AUDIENCE_LABELS), dimension))),
+        "sentiment": fit_head(pooled[train], teacher_sentiment[train], np.zeros((len(sentiment_labels), dimension))),
+        "keyphrase": fit_head(
+            train_tokens, np.eye(len(KEYPHRASE_TAGS))[train_tags], np.zeros((len(KEYPHRASE_TAGS), dimension)),
+            sample_weight=(1.0 / counts)[train_tags]
+        ),
+    }
+    engine.set_heads(heads, sentiment_labels)
+
+    test_captions = [captions[i] for i in test]
+    started = time.perf_counter()
+    student = [result for start in range(0, len(test_captions), batch_size) for result in engine(test_captions[start:start + batch_size])]
+    student_seconds = time.perf_counter() - started
+
+    student_audience = np.asarray(
+        [[dict(zip(o["audience"]["labels"], o["audience"]["scores"]))[label] for label in AUDIENCE_LABELS] for o in student]
+    )
+    report = {
+        "captions": len(captions),
+        "holdout": len(test),
+        "three_models_ms_per_caption": round(1000 * teacher_seconds / len(captions), 2),
+        "multitask_ms_per_caption": round(1000 * student_seconds / len(test), 2),
+        "audience": _agreement(teacher_audience[test], student_audience),
+        "sentiment": {
+            "label_agreement": round(float(np.mean([
+                sentiment_labels[int(teacher_sentiment[i].argmax())] == o["sentiment"]["label"] for i, o in zip(test, student)
+            ])), 4),
+        },
+        "keyphrase": _keyphrase_agreement(
+            [_words(teacher["key_words"][i]) for i in test], [_words(o["key_words"]) for o in student]
+        ),
+    }
+
+    if out_path:
+        arrays = {f"{name}_{part}": value for name, (weights, bias) in heads.items() for part, value in (("weights", weights), ("bias", bias))}
+        save_head(
+            out_path, audience_labels=np.asarray(AUDIENCE_LABELS), sentiment_labels=np.asarray(sentiment_labels),
+            encoder=np.asarray(model_registry.model_names()["sentence"]), **arrays
+        )
+        report["head_path"] = out_path
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return report
+
+
+def main(argv=None):
+    distillation_main(
+        argv,
+        "Distill the audience, sentiment and keyphrase models into heads on one sentence-encoder pass "
+        "and report their agreement with the three models.",
+        "TEXT_MULTITASK_HEAD_PATH", MultiTaskTextEngine(None).head_path, distill
+    )
+
+
+if __name__ == "__main__":
+    main()
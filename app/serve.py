@@ -0,0 +1,169 @@
+import os
+import gc
+import sys
+import glob
+import time
+import signal
+import socket
+import argparse
+import tempfile
+
+
+def bind_socket(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def prepare_metrics_dir():
+    directory = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="analyzer_metrics_"))
+    os.makedirs(directory, exist_ok=True)
+    # Files left by a previous run would be summed into this one.
+    for path in glob.glob(os.path.join(directory, "*.db")):
+        os.remove(path)
+    return directory
+
+
+class Supervisor:
+    """Loads the models once in the parent and forks workers that share their weights copy-on-write."""
+
+    def __init__(self, args):
+        # Must happen before app.metrics is imported so every metric writes to the shared directory.
+        self.metrics_dir = prepare_metrics_dir()
+
+        from app import main as server
+        from app.logger import LogManager
+        from app.model_registry import model_registry
+
+        log_manager = LogManager('serve')
+        self.logger = log_manager.get_logger()
+
+        self.args = args
+        self.server = server
+        self.models = model_registry
+        self.threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+        self.sock = bind_socket(args.host, args.port)
+        self.children = {}
+        self.stopping = False
+
+    def preload(self):
+        # CUDA contexts and ONNX Runtime sessions do not survive fork(); those workers load their own models.
+        if self.models.backend.name != "torch" or self.models.device != "cpu":
+            self.logger.warning(
+                f"Preloading skipped on {self.models.backend.name}/{self.models.device}; every worker loads its own models."
+            )
+            return
+
+        import torch
+
+        # libgomp thread pools do not survive fork(): the parent stays single-threaded and each worker
+        # sizes its own pool after the fork.
+        torch.set_num_threads(1)
+        started = time.perf_counter()
+        self.server.prepare_models()
+        self.server.startup_tracker.mark("preload")
+        self.logger.info(f"Models preloaded in {time.perf_counter() - started:.1f}s: {self.models.load_seconds}")
+
+    def spawn(self):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.monotonic()
+            return
+
+        exit_code = 0
+        try:
+            self.run_worker()
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else 1
+        except BaseException:
+            self.logger.exception("Worker crashed.")
+            exit_code = 1
+        finally:
+            from app.logger import shutdown_logging
+
+            shutdown_logging()
+            os._exit(exit_code)
+
+    def run_worker(self):
+        import uvicorn
+
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        if "torch" in sys.modules:
+            sys.modules["torch"].set_num_threads(self.threads)
+        else:
+            os.environ.setdefault("OMP_NUM_THREADS", str(self.threads))
+
+        config = uvicorn.Config(self.server.app, log_level=self.args.log_level, access_log=False)
+        uvicorn.Server(config).run(sockets=[self.sock])
+
+    def stop(self, signum, frame):
+        self.stopping = True
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def reap(self, pid, status):
+        from prometheus_client import multiprocess
+
+        started = self.children.pop(pid)
+        multiprocess.mark_process_dead(pid, self.metrics_dir)
+        if self.stopping:
+            return
+
+        self.logger.warning(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; restarting.")
+        if time.monotonic() - started < 5:
+            # Avoids a tight restart loop when workers die during startup.
+            time.sleep(1)
+        self.spawn()
+
+    def run(self):
+        self.preload()
+        # Moves everything allocated so far out of the collector's reach, so gc passes in the workers
+        # do not write to (and un-share) the parent's pages.
+        gc.collect()
+        gc.freeze()
+
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.args.workers):
+            self.spawn()
+        self.logger.info(
+            f"Serving on {self.args.host}:{self.args.port} with {self.args.workers} workers "
+            f"({self.threads} threads each), pids {sorted(self.children)}."
+        )
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            if pid in self.children:
+                self.reap(pid, status)
+
+        self.sock.close()
+        self.logger.info("All workers stopped.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the analyzer with several workers that share one copy of the models.")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    parser.add_argument("--threads", type=int, default=int(os.getenv("TORCH_THREADS_PER_WORKER", "0")),
+                        help="Torch intra-op threads per worker (defaults to CPU count / workers).")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    if not hasattr(os, "fork"):
+        parser.error("multi-worker serving needs fork(); run uvicorn directly on this platform")
+    Supervisor(args).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import os
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+
+from app.logger import LogManager
+from app.metrics import ACTIVE_SESSIONS, SESSION_EDITS
+
+
+class EditSession:
+    """Image-side features pinned for one post while its caption is being edited."""
+
+    def __init__(self, image, image_result):
+        self.id = uuid.uuid4().hex
+        self.image = image
+        self.image_result = image_result
+        self.last_used = time.monotonic()
+        self.version = 0
+        self.pending = None
+
+
+class SessionStore:
+    def __init__(self):
+
+        log_manager = LogManager('sessions')
+        self.logger = log_manager.get_logger()
+
+        self.idle_seconds = float(os.getenv("SESSION_IDLE_SECONDS", "600"))
+        self.max_sessions = int(os.getenv("SESSION_MAX", "1000"))
+        self.debounce = float(os.getenv("SESSION_DEBOUNCE_MS", "150")) / 1000.0
+        self._sessions = OrderedDict()
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if len(self._sessions) <= self.max_sessions and now - session.last_used <= self.idle_seconds:
+                break
+            del self._sessions[session.id]
+            self.logger.info(f"Evicted edit session {session.id}.")
+        ACTIVE_SESSIONS.set(len(self._sessions))
+
+    def add(self, session):
+        self._sessions[session.id] = session
+        self._evict()
+        return session
+
+    def get(self, session_id):
+        self._evict()
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.last_used = time.monotonic()
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def remove(self, session_id):
+        removed = self._sessions.pop(session_id, None) is not None
+        ACTIVE_SESSIONS.set(len(self._sessions))
+        return removed
+
+    async def edit(self, session, text, score):
+        """Scores text after a quiet period; edits superseded during it share the newest edit's result."""
+        session.version += 1
+        version = session.version
+        if session.pending is None:
+            session.pending = asyncio.get_running_loop().create_future()
+        future = session.pending
+
+        await asyncio.sleep(self.debounce)
+        if session.version != version:
+            SESSION_EDITS.labels("coalesced").inc()
+            return await asyncio.shield(future)
+
+        # Edits arriving from here on wait for the next quiet period and get a fresh result.
+        session.pending = None
+        SESSION_EDITS.labels("scored").inc()
+        try:
+            result = {"text": text, "result": await score(session, text)}
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            # Marks it retrieved, in case no superseded edit is waiting on it.
+            future.exception()
+            raise
+        finally:
+            if not future.done():
+                future.cancel()
@@ -0,0 +1,69 @@
+import os
+import time
+import asyncio
+
+from app.logger import LogManager
+from app.metrics import SINGLE_FLIGHT_CALLS, SINGLE_FLIGHT_SAVED_SECONDS
+
+flights = {}
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one in-flight computation; nothing is kept once it finishes."""
+
+    def __init__(self, level):
+
+        log_manager = LogManager('singleFlight')
+        self.logger = log_manager.get_logger()
+
+        self.level = level
+        self.enabled = os.getenv("SINGLE_FLIGHT", "1") != "0"
+        self._calls = {}
+        self._executed = 0
+        self._shared = 0
+        self._saved_seconds = 0.0
+
+        flights[level] = self
+
+    async def do(self, key, func, *args):
+        if not self.enabled:
+            return await func(*args)
+
+        call = self._calls.get(key)
+        if call is None:
+            # Runs as a task of its own, so a caller going away does not cancel the others.
+            call = {"task": asyncio.ensure_future(func(*args)), "started": time.perf_counter(), "shared": 0}
+            self._calls[key] = call
+            call["task"].add_done_callback(lambda task: self._finish(key, call))
+            self._executed += 1
+            SINGLE_FLIGHT_CALLS.labels(self.level, "executed").inc()
+        else:
+            call["shared"] += 1
+            self._shared += 1
+            SINGLE_FLIGHT_CALLS.labels(self.level, "shared").inc()
+            self.logger.info(f"Joined an in-flight {self.level} call ({call['shared']} sharing).")
+
+        return await asyncio.shield(call["task"])
+
+    def _finish(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call["task"].cancelled():
+            # Marks the exception retrieved in case every caller has gone away.
+            call["task"].exception()
+        if call["shared"]:
+            saved = (time.perf_counter() - call["started"]) * call["shared"]
+            self._saved_seconds += saved
+            SINGLE_FLIGHT_SAVED_SECONDS.labels(self.level).inc(saved)
+
+    def stats(self):
+        return {
+            "in_flight": len(self._calls),
+            "executed": self._executed,
+            "shared": self._shared,
+            "saved_seconds": round(self._saved_seconds, 3),
+        }
+
+
+def single_flight_stats():
+    return {level: flight.stats() for level, flight in flights.items()}
@@ -0,0 +1,47 @@
+import time
+import threading
+
+from app.metrics import STARTUP_SECONDS
+
+
+class StartupTracker:
+    """Times each startup phase from the first app import and tracks readiness."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.status = "starting"
+        self.error = None
+        self._lock = threading.Lock()
+
+    def mark(self, phase):
+        elapsed = round(time.perf_counter() - self.started, 3)
+        with self._lock:
+            self.phases[phase] = elapsed
+        STARTUP_SECONDS.labels(phase).set(elapsed)
+        return elapsed
+
+    def set_ready(self):
+        self.mark("ready")
+        self.status = "ready"
+
+    def set_failed(self, error):
+        self.mark("failed")
+        self.error = str(error)
+        self.status = "failed"
+
+    @property
+    def ready(self):
+        return self.status == "ready"
+
+    def report(self, load_seconds=None):
+        with self._lock:
+            report = {"status": self.status, "seconds_since_start": dict(self.phases)}
+        if load_seconds:
+            report["model_load_seconds"] = dict(load_seconds)
+        if self.error:
+            report["error"] = self.error
+        return report
+
+
+startup_tracker = StartupTracker()
@@ -1,56 +1,65 @@
-import os
 from typing import Any, Dict, List
-from transformers import pipeline
-import textstat
 
+from app.audience_classifier import AUDIENCE_LABELS, EmbeddingAudienceClassifier
+from app.batching import MicroBatcher
 from app.logger import LogManager
+from app.metrics import stage
+from app.multitask_text import MultiTaskTextEngine
+
+STEP_LABELS = {
+    "audience": "audience classification",
+    "sentiment": "sentiment analysis",
+    "keyphrase": "keyphrase extraction",
+    "readability": "readability metrics",
+}
 
 class TextAnalyzer:
-    def __init__(self, post_text_list: list[str]):
+    def __init__(self, models):
 
         log_manager = LogManager('textAnalyzer')
         self.logger = log_manager.get_logger()
-        
-        self.post_text_list = post_text_list
 
-        zero_shot_model = os.getenv("ZERO_SHOT_MODEL", "facebook/bart-large-mnli")
-        sentiment_model = os.getenv("SENTIMENT_MODEL", "finiteautomata/bertweet-base-sentiment-analysis")
-        keyphrase_model = os.getenv("KEYPHRASE_MODEL", "ml6team/keyphrase-extraction-kbir-inspec")
-        
-        self.model_classifier = pipeline(
-            "zero-shot-classification", 
-            model=zero_shot_model
+        self.models = models
+
+        if models.audience_mode == "embedding":
+            self.audience_classifier = EmbeddingAudienceClassifier(models)
+            self.audience_batcher = MicroBatcher("audience-embedding", self.audience_classifier)
+        else:
+            self.audience_classifier = None
+            self.audience_batcher = MicroBatcher("zero-shot-classification", self._classify_audience_batch)
+        self.sentiment_batcher = MicroBatcher("sentiment-analysis", self._sentiment_batch)
+        self.key_word_batcher = MicroBatcher("token-classification", self._key_word_batch)
+
+        if models.text_engine == "multitask":
+            self.multitask = MultiTaskTextEngine(models)
+            self.multitask_batcher = MicroBatcher("multitask-text", self.multitask)
+        else:
+            self.multitask = None
+
+    def _classify_audience_batch(self, texts: list[str]):
+        return self.models.zero_shot_classifier()(
+            texts,
+            candidate_labels=AUDIENCE_LABELS,
+            batch_size=len(texts) * len(AUDIENCE_LABELS)
         )
 
-        self.model_sentiment_analysis = pipeline(
-            "sentiment-analysis", 
-            model = sentiment_model)
-        
-        self.model_key_word = pipeline(
-            "token-classification",
-            model=keyphrase_model,
-            aggregation_strategy="simple"
-        )
-        
+    def _sentiment_batch(self, texts: list[str]):
+        return self.models.sentiment_classifier()(texts, batch_size=len(texts), truncation=True)
 
-    def classifier_public_age(self):
+    def _key_word_batch(self, texts: list[str]):
+        return self.models.keyphrase_extractor()(texts, batch_size=len(texts))
 
-        labels = [
-            "young female audience (18–30)",
-            "young male audience (18–30)",
-            "adult audience (30–50)",
-            "general audience"
-        ]
-        
-        return self.model_classifier(self.post_text_list, candidate_labels=labels)
+    def classifier_public_age(self, post_text_list: list[str]):
+        return self.audience_batcher.submit(post_text_list)
     
-    def sentiment_analysis(self):
-        
-        result = self.model_sentiment_analysis(self.post_text_list)
+    def sentiment_analysis(self, post_text_list: list[str]):
+        return self._map_sentiment(post_text_list, self.sentiment_batcher.submit(post_text_list))
+
+    def _map_sentiment(self, post_text_list: list[str], result):
         label_map = {"POS": "positivo", "NEG": "negativo", "NEU": "neutro"}
         mapped_results: List[Dict[str, Any]] = []
 
-        for text, res in zip(self.post_text_list, result):
+        for text, res in zip(post_text_list, result):
             label = label_map.get(res.get("label", ""), res.get("label", ""))
             score = round(float(res.get("score", 0.0)), 3)
 
@@ -62,12 +71,13 @@ class TextAnalyzer:
 
         return mapped_results
     
-    def key_word_analyse(self):
+    def key_word_analyse(self, post_text_list: list[str]):
+        return self._map_key_words(post_text_list, self.key_word_batcher.submit(post_text_list))
 
-        raw_results = self.model_key_word(self.post_text_list)
+    def _map_key_words(self, post_text_list: list[str], raw_results):
         mapped_results: List[Dict[str, Any]] = []
 
-        for text, kw_list in zip(self.post_text_list, raw_results):
+        for text, kw_list in zip(post_text_list, raw_results):
             key_words = []
             for kw in kw_list:
                 word = (kw.get("word") or kw.get("label") or "").strip()
@@ -88,10 +98,12 @@ class TextAnalyzer:
 
         return mapped_results
     
-    def readability_metrics(self):
+    def readability_metrics(self, post_text_list: list[str]):
+        import textstat
+
         mapped_results: List[Dict[str, Any]] = []
 
-        for text in self.post_text_list:
+        for text in post_text_list:
             fre = textstat.flesch_reading_ease(text)               
 
             fre_clamped = max(0.0, min(100.0, float(fre)))
@@ -116,28 +128,54 @@ class TextAnalyzer:
 
         return mapped_results
     
-    def analyser(self) -> Dict[str, Any]:
-        self.logger.info("Starting TextAnalyzer.analyser orchestrator.")
-        try:
-            audience_result = self.classifier_public_age()
-        except Exception as e:
-           self.logger(f"audience classification failed: {e}", exc_info=True)
-
-        try:
-            sentiment_result = self.sentiment_analysis()
-        except Exception as e:
-            self.logger(f"sentiment analysis failed: {e}", exc_info=True)
+    def multitask_analysis(self, post_text_list: list[str]):
+        outputs = self.multitask_batcher.submit(post_text_list)
+        return (
+            [output["audience"] for output in outputs],
+            self._map_sentiment(post_text_list, [output["sentiment"] for output in outputs]),
+            self._map_key_words(post_text_list, [output["key_words"] for output in outputs]),
+        )
 
+    def run_step(self, name: str, post_text_list: list[str]):
+        """Runs one analyser() step on its own; "multitask" returns the audience, sentiment and keyphrase results."""
+        if name == "multitask":
+            try:
+                with stage("text.multitask"):
+                    return self.multitask_analysis(post_text_list)
+            except Exception as e:
+                self.logger.error(f"multi-task text analysis failed: {e}", exc_info=True)
+                return tuple({"error": f"{STEP_LABELS[step]} failed: {e}"} for step in ("audience", "sentiment", "keyphrase"))
+
+        step = {
+            "audience": self.classifier_public_age,
+            "sentiment": self.sentiment_analysis,
+            "keyphrase": self.key_word_analyse,
+            "readability": self.readability_metrics,
+        }[name]
         try:
-            key_word_result = self.key_word_analyse()
+            with stage(f"text.{name}"):
+                return step(post_text_list)
         except Exception as e:
-            self.logger(f"keyphrase extraction failed: {e}", exc_info=True)
+            self.logger.error(f"{STEP_LABELS[name]} failed: {e}", exc_info=True)
+            return {"error": f"{STEP_LABELS[name]} failed: {e}"}
 
-        try:
-            readability_metrics_result = self.readability_metrics()
-        except Exception as e:
-            self.logger(f"readability metrics failed: {e}", exc_info=True)
+    def steps(self):
+        return ["multitask", "readability"] if self.multitask is not None else list(STEP_LABELS)
 
+    def analyser(self, post_text_list: list[str]) -> Dict[str, Any]:
+        self.logger.info("Starting TextAnalyzer.analyser orchestrator.")
+        if self.multitask is not None:
+            audience_result, sentiment_result, key_word_result = self.run_step("multitask", post_text_list)
+        else:
+            audience_result = self.run_step("audience", post_text_list)
+            sentiment_result = self.run_step("sentiment", post_text_list)
+            key_word_result = self.run_step("keyphrase", post_text_list)
+        readability_metrics_result = self.run_step("readability", post_text_list)
+
+        return self.merge(audience_result, sentiment_result, key_word_result, readability_metrics_result)
+
+    def merge(self, audience_result, sentiment_result, key_word_result, readability_metrics_result) -> Dict[str, Any]:
+        """Joins step results by sequence; a step given as None is left out, like a failed one."""
         try:
             self.logger.info("Merging analysis outputs.")
             merged: Dict[str, Dict[str, Any]] = {}
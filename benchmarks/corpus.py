@@ -0,0 +1,103 @@
+import io
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+IMAGE_SIZES = [(640, 480), (1080, 1080), (1080, 1350), (4000, 3000)]
+
+SUBJECTS = ["beach day", "new sneakers", "morning coffee", "city lights", "family dinner", "gym session",
+            "skincare routine", "road trip", "book club", "street food", "concert night", "home office"]
+MOODS = ["Loving this", "Can't believe", "So grateful for", "Finally trying", "Nothing beats", "Throwback to"]
+HASHTAGS = ["#travel", "#food", "#fitness", "#beauty", "#ootd", "#love", "#photooftheday", "#instagood",
+            "#summer", "#weekend", "#coffee", "#nature", "#style", "#tbt", "#motivation", "#friends"]
+
+
+def synthetic_image(width, height, rng):
+    # Smooth gradients plus a few shapes compress like photos rather than like noise.
+    x = np.linspace(0, 1, width, dtype=np.float32)
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    base = rng.uniform(0, 255, 3)
+    pixels = np.stack([
+        base[0] * x + (255 - base[0]) * y,
+        base[1] * (1 - x) + base[1] * y,
+        base[2] * np.sqrt(x * y + 1e-6),
+    ], axis=-1).clip(0, 255).astype(np.uint8)
+
+    image = Image.fromarray(pixels)
+    draw = ImageDraw.Draw(image)
+    for _ in range(6):
+        x0, y0 = rng.integers(0, width), rng.integers(0, height)
+        radius = int(rng.integers(min(width, height) // 20, min(width, height) // 4))
+        draw.ellipse([x0 - radius, y0 - radius, x0 + radius, y0 + radius], fill=tuple(int(c) for c in rng.integers(0, 256, 3)))
+    return image
+
+
+def build_corpus(count, seed=0, sizes=None):
+    rng = np.random.default_rng(seed)
+    sizes = sizes or IMAGE_SIZES
+
+    images, captions = [], []
+    for i in range(count):
+        width, height = sizes[i % len(sizes)]
+        buffer = io.BytesIO()
+        synthetic_image(width, height, rng).save(buffer, format="JPEG", quality=85)
+        images.append(buffer.getvalue())
+
+        tags = rng.choice(HASHTAGS, size=int(rng.integers(0, 6)), replace=False)
+        caption = f"{rng.choice(MOODS)} {rng.choice(SUBJECTS)} with the best people, post {i}!"
+        captions.append(" ".join([caption, *tags]))
+
+    return images, captions
+
+
+class StubImageServer:
+    """Serves the synthetic images at http://127.0.0.1:<port>/images/<i>.jpg with ETags."""
+
+    def __init__(self, images):
+        self.images = images
+        self.etags = [f'"{hashlib.sha256(data).hexdigest()[:16]}"' for data in images]
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                try:
+                    index = int(self.path.rsplit("/", 1)[-1].split(".")[0])
+                    data = server.images[index]
+                except (ValueError, IndexError):
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("ETag", server.etags[index])
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def url(self, index):
+        return f"http://127.0.0.1:{self.port}/images/{index}.jpg"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-image-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
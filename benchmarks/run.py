@@ -0,0 +1,283 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.corpus import StubImageServer, build_corpus
+from benchmarks.stub_models import build_stub_models
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def configure_environment(models, work_dir, keep_cache):
+    os.environ.update({
+        "ZERO_SHOT_MODEL": models["zero_shot"],
+        "SENTIMENT_MODEL": models["sentiment"],
+        "KEYPHRASE_MODEL": models["keyphrase"],
+        "CLIP_MODEL": models["clip"],
+        "HF_HUB_OFFLINE": "1",
+        "TRANSFORMERS_VERBOSITY": "error",
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"),
+        "CACHE_ENABLED": "1" if keep_cache else "0",
+        "CACHE_DB_PATH": "",
+        # A fresh hashtag table and no ANN index keep runs comparable with each other.
+        "HASHTAG_INDEX_DIR": tempfile.mkdtemp(prefix="hashtag_index_", dir=work_dir),
+        "HASHTAG_ANN_DIR": os.path.join(work_dir, "no_hashtag_ann"),
+    })
+
+
+def summarize(values):
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return {}
+    return {
+        "mean": round(float(values.mean()), 3),
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+        "max": round(float(values.max()), 3),
+    }
+
+
+def payload(server, captions, index):
+    return {"text": [captions[index % len(captions)]], "image_url": server.url(index % len(server.images))}
+
+
+async def post(client, body, profile=False):
+    started = time.perf_counter()
+    response = await client.post("/analyze-post", params={"profile": 1} if profile else None, json=body)
+    elapsed_ms = (time.perf_counter() - started) * 1000.0
+    response.raise_for_status()
+    return elapsed_ms, response.json()
+
+
+async def wait_until_ready(client, timeout=600.0):
+    deadline = time.perf_counter() + timeout
+    while True:
+        response = await client.get("/ready")
+        if response.status_code == 200:
+            return response.json()
+        if response.json().get("status") == "failed" or time.perf_counter() > deadline:
+            raise RuntimeError(f"Analyzer did not become ready: {response.text}")
+        await asyncio.sleep(0.05)
+
+
+async def measure_latency(client, server, captions, requests):
+    totals, stages = [], {}
+    for i in range(requests):
+        elapsed_ms, result = await post(client, payload(server, captions, i), profile=True)
+        totals.append(elapsed_ms)
+        for name, value in result["profile"]["stages_ms"].items():
+            stages.setdefault(name, []).append(value)
+
+    return {
+        "requests": requests,
+        "total_ms": summarize(totals),
+        "stages_ms": {name: summarize(values) for name, values in sorted(stages.items())},
+    }
+
+
+async def measure_throughput(client, server, captions, concurrency, requests):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            return (await post(client, payload(server, captions, i)))[0]
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*[one(i) for i in range(requests)])
+    elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 3),
+        "latency_ms": summarize(latencies),
+    }
+
+
+async def run_benchmarks(server, captions, args):
+    import httpx
+    from app.main import app
+    from app.metrics import peak_rss_bytes
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=300) as client:
+            await wait_until_ready(client)
+            await post(client, payload(server, captions, 0))
+
+            print(f"Measuring single-request latency ({args.latency_requests} requests)...", file=sys.stderr)
+            latency = await measure_latency(client, server, captions, args.latency_requests)
+
+            throughput = []
+            for concurrency in args.concurrency:
+                print(f"Measuring throughput at concurrency {concurrency}...", file=sys.stderr)
+                throughput.append(await measure_throughput(
+                    client, server, captions, concurrency, max(args.requests_per_level, concurrency)
+                ))
+
+    return {"latency": latency, "throughput": throughput, "peak_rss_bytes": peak_rss_bytes()}
+
+
+def cold_start_probe(image_url, caption):
+    import asyncio
+    started = time.perf_counter()
+    import httpx
+    from app.main import app
+    from app.metrics import peak_rss_bytes
+    imported = time.perf_counter()
+
+    async def probe():
+        async with app.router.lifespan_context(app):
+            serving = time.perf_counter()
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=300) as client:
+                report = await wait_until_ready(client)
+                ready = time.perf_counter()
+                response = await client.post("/analyze-post", json={"text": [caption], "image_url": image_url})
+                response.raise_for_status()
+            return serving, ready, time.perf_counter(), report
+
+    serving, ready, first_response, report = asyncio.run(probe())
+    print(json.dumps({
+        "import_seconds": round(imported - started, 3),
+        "serving_seconds": round(serving - imported, 3),
+        "startup_seconds": round(ready - imported, 3),
+        "first_request_seconds": round(first_response - ready, 3),
+        "total_seconds": round(first_response - started, 3),
+        "model_load_seconds": report.get("model_load_seconds", {}),
+        "peak_rss_bytes": peak_rss_bytes(),
+    }))
+
+
+def measure_cold_start(server, captions):
+    print("Measuring cold start in a fresh process...", file=sys.stderr)
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.run", "--cold-start-probe", server.url(0), captions[0]],
+        cwd=ROOT, env=dict(os.environ), capture_output=True, text=True, check=True
+    )
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def metadata(args):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    import torch
+    import transformers
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "torch": torch.__version__,
+        "transformers": transformers.__version__,
+        "inference_backend": os.getenv("INFERENCE_BACKEND", "torch"),
+        "config": {
+            "posts": args.posts,
+            "hidden_size": args.hidden_size,
+            "seed": args.seed,
+            "latency_requests": args.latency_requests,
+            "concurrency": args.concurrency,
+            "requests_per_level": args.requests_per_level,
+            "cache": args.keep_cache,
+        },
+    }
+
+
+def flatten(report):
+    metrics = {
+        "cold_start.total_seconds": report["cold_start"].get("total_seconds"),
+        "cold_start.import_seconds": report["cold_start"].get("import_seconds"),
+        "cold_start.startup_seconds": report["cold_start"].get("startup_seconds"),
+        "latency.total_ms.p50": report["latency"]["total_ms"].get("p50"),
+        "latency.total_ms.p95": report["latency"]["total_ms"].get("p95"),
+        "peak_rss_bytes": report["peak_rss_bytes"],
+    }
+    for name, values in report["latency"]["stages_ms"].items():
+        metrics[f"latency.stages_ms.{name}.p50"] = values.get("p50")
+    for level in report["throughput"]:
+        metrics[f"throughput.c{level['concurrency']}.requests_per_second"] = level["requests_per_second"]
+    return metrics
+
+
+def compare(report, baseline):
+    current, previous = flatten(report), flatten(baseline)
+    comparison = {}
+    for name, value in current.items():
+        before = previous.get(name)
+        if value is None or not before:
+            continue
+        comparison[name] = {
+            "baseline": before,
+            "current": value,
+            "change_pct": round(100.0 * (value - before) / before, 1),
+        }
+    return comparison
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of /analyze-post with stand-in models.")
+    parser.add_argument("--out", default=None, help="Write the JSON report to this file.")
+    parser.add_argument("--baseline", default=None, help="Previous report to compare against.")
+    parser.add_argument("--work-dir", default=os.path.join(ROOT, "app", "data", "benchmark"))
+    parser.add_argument("--posts", type=int, default=24, help="Number of synthetic posts in the corpus.")
+    parser.add_argument("--hidden-size", type=int, default=64, help="Hidden size of the stand-in models.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=lambda value: [int(v) for v in value.split(",")], default=[1, 4, 16])
+    parser.add_argument("--requests-per-level", type=int, default=48)
+    parser.add_argument("--keep-cache", action="store_true", help="Leave the feature cache enabled.")
+    parser.add_argument("--cold-start-probe", nargs=2, metavar=("IMAGE_URL", "CAPTION"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.cold_start_probe:
+        cold_start_probe(*args.cold_start_probe)
+        return
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    print("Building stand-in models and corpus...", file=sys.stderr)
+    models = build_stub_models(os.path.join(args.work_dir, "models"), hidden_size=args.hidden_size, seed=args.seed)
+    configure_environment(models, args.work_dir, args.keep_cache)
+    images, captions = build_corpus(args.posts, seed=args.seed)
+
+    server = StubImageServer(images).start()
+    try:
+        cold_start = measure_cold_start(server, captions)
+        results = asyncio.run(run_benchmarks(server, captions, args))
+    finally:
+        server.stop()
+
+    report = {"meta": metadata(args), "cold_start": cold_start, **results}
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["comparison"] = compare(report, json.load(f))
+        for name, change in report["comparison"].items():
+            print(f"{name}: {change['baseline']} -> {change['current']} ({change['change_pct']:+.1f}%)", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        print(f"Report written to {args.out}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import os
+import json
+
+import torch
+from transformers import (
+    BartConfig, BartForSequenceClassification, BartTokenizer,
+    RobertaConfig, RobertaForSequenceClassification, RobertaTokenizer,
+    BertConfig, BertForTokenClassification, BertTokenizer,
+    CLIPConfig, CLIPModel, CLIPTokenizer, CLIPImageProcessor, CLIPProcessor,
+)
+from transformers.models.gpt2.tokenization_gpt2 import bytes_to_unicode
+
+# Randomly initialised models with the same architectures and tokenizers as the production
+# checkpoints, small enough to build in seconds without network access.
+STUB_MODELS = {
+    "zero_shot": "bart",
+    "sentiment": "sentiment",
+    "keyphrase": "keyphrase",
+    "clip": "clip",
+}
+
+BYTE_LEVEL_SPECIALS = ["<s>", "<pad>", "</s>", "<unk>", "<mask>"]
+
+
+def _byte_level_vocab(directory, specials):
+    vocab = {token: i for i, token in enumerate(specials + list(bytes_to_unicode().values()))}
+    with open(os.path.join(directory, "vocab.json"), "w", encoding="utf-8") as f:
+        json.dump(vocab, f)
+    with open(os.path.join(directory, "merges.txt"), "w", encoding="utf-8") as f:
+        f.write("#version: 0.2\n")
+    return len(vocab)
+
+
+def build_zero_shot(directory, hidden_size):
+    vocab_size = _byte_level_vocab(directory, BYTE_LEVEL_SPECIALS)
+    labels = ["contradiction", "neutral", "entailment"]
+    config = BartConfig(
+        vocab_size=vocab_size, d_model=hidden_size, encoder_layers=2, decoder_layers=2,
+        encoder_attention_heads=2, decoder_attention_heads=2,
+        encoder_ffn_dim=hidden_size * 4, decoder_ffn_dim=hidden_size * 4, max_position_embeddings=512,
+        id2label=dict(enumerate(labels)), label2id={label: i for i, label in enumerate(labels)},
+        pad_token_id=1, bos_token_id=0, eos_token_id=2,
+    )
+    BartForSequenceClassification(config).save_pretrained(directory)
+    BartTokenizer(os.path.join(directory, "vocab.json"), os.path.join(directory, "merges.txt")).save_pretrained(directory)
+
+
+def build_sentiment(directory, hidden_size):
+    vocab_size = _byte_level_vocab(directory, BYTE_LEVEL_SPECIALS)
+    labels = ["NEG", "NEU", "POS"]
+    config = RobertaConfig(
+        vocab_size=vocab_size, hidden_size=hidden_size, num_hidden_layers=2, num_attention_heads=2,
+        intermediate_size=hidden_size * 4, max_position_embeddings=520,
+        id2label=dict(enumerate(labels)), label2id={label: i for i, label in enumerate(labels)}, pad_token_id=1,
+    )
+    RobertaForSequenceClassification(config).save_pretrained(directory)
+    RobertaTokenizer(os.path.join(directory, "vocab.json"), os.path.join(directory, "merges.txt")).save_pretrained(directory)
+
+
+def build_keyphrase(directory, hidden_size):
+    chars = [chr(c) for c in range(32, 127)]
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + chars + ["##" + c for c in chars]
+    with open(os.path.join(directory, "vocab.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(vocab))
+    labels = ["B-KEY", "I-KEY", "O"]
+    config = BertConfig(
+        vocab_size=len(vocab), hidden_size=hidden_size, num_hidden_layers=2, num_attention_heads=2,
+        intermediate_size=hidden_size * 4,
+        id2label=dict(enumerate(labels)), label2id={label: i for i, label in enumerate(labels)},
+    )
+    BertForTokenClassification(config).save_pretrained(directory)
+    BertTokenizer(os.path.join(directory, "vocab.txt")).save_pretrained(directory)
+
+
+def build_clip(directory, hidden_size):
+    chars = list(bytes_to_unicode().values())
+    vocab = {token: i for i, token in enumerate(chars + [c + "</w>" for c in chars] + ["<|startoftext|>", "<|endoftext|>"])}
+    with open(os.path.join(directory, "vocab.json"), "w", encoding="utf-8") as f:
+        json.dump(vocab, f)
+    with open(os.path.join(directory, "merges.txt"), "w", encoding="utf-8") as f:
+        f.write("#version: 0.2\n")
+
+    config = CLIPConfig(
+        text_config=dict(
+            vocab_size=len(vocab), hidden_size=hidden_size, intermediate_size=hidden_size * 4,
+            num_hidden_layers=2, num_attention_heads=2, max_position_embeddings=77,
+            bos_token_id=len(vocab) - 2, eos_token_id=len(vocab) - 1, pad_token_id=len(vocab) - 1,
+        ),
+        vision_config=dict(
+            hidden_size=hidden_size, intermediate_size=hidden_size * 4, num_hidden_layers=2,
+            num_attention_heads=2, image_size=224, patch_size=32,
+        ),
+        projection_dim=hidden_size,
+    )
+    CLIPModel(config).save_pretrained(directory)
+    CLIPProcessor(
+        image_processor=CLIPImageProcessor(size={"shortest_edge": 224}, crop_size={"height": 224, "width": 224}),
+        tokenizer=CLIPTokenizer(os.path.join(directory, "vocab.json"), os.path.join(directory, "merges.txt")),
+    ).save_pretrained(directory)
+
+
+BUILDERS = {
+    "bart": build_zero_shot,
+    "sentiment": build_sentiment,
+    "keyphrase": build_keyphrase,
+    "clip": build_clip,
+}
+
+
+def build_stub_models(out_dir, hidden_size=64, seed=0):
+    """Builds (or reuses) the stand-in models and returns {model_key: path}."""
+    paths = {}
+    for key, name in STUB_MODELS.items():
+        directory = os.path.join(out_dir, f"{name}-{hidden_size}")
+        if not os.path.exists(os.path.join(directory, "config.json")):
+            os.makedirs(directory, exist_ok=True)
+            torch.manual_seed(seed)
+            BUILDERS[name](directory, hidden_size)
+        paths[key] = directory
+    return paths
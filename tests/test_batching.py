@@ -0,0 +1,46 @@
+import threading
+
+import pytest
+
+from app.batching import MicroBatcher
+
+
+def make_batcher(name, calls):
+    def handler(items):
+        calls.append(list(items))
+        if "bad" in items:
+            raise ValueError("bad input")
+        return [item.upper() for item in items]
+
+    # A long wait and a batch size of 3 make the three requests below share one batch.
+    return MicroBatcher(name, handler, max_batch_size=3, max_wait_ms=500)
+
+
+def test_one_bad_input_does_not_fail_the_other_callers_in_its_batch():
+    calls = []
+    batcher = make_batcher("test-poison", calls)
+    outcomes = {}
+
+    def submit(items):
+        try:
+            outcomes[items[0]] = batcher.submit(items)
+        except ValueError as e:
+            outcomes[items[0]] = e
+
+    threads = [threading.Thread(target=submit, args=(items,)) for items in (["a"], ["bad"], ["b"])]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(calls[0]) == ["a", "b", "bad"]
+    assert outcomes["a"] == ["A"]
+    assert outcomes["b"] == ["B"]
+    assert isinstance(outcomes["bad"], ValueError)
+
+
+def test_a_request_fails_when_one_of_its_own_items_fails():
+    batcher = make_batcher("test-own-item", [])
+    with pytest.raises(ValueError):
+        batcher.submit(["a", "bad"])
+    assert batcher.submit(["c"]) == ["C"]
@@ -0,0 +1,48 @@
+import asyncio
+
+from app.cache import FeatureCache
+
+
+def test_memory_hits_do_not_leave_the_event_loop(tmp_path):
+    cache = FeatureCache(db_path=str(tmp_path / "cache.sqlite"))
+    cache.set("result", "a", {"score": 1})
+    blocking_calls = []
+
+    async def run_blocking(func, *args):
+        blocking_calls.append(func)
+        return func(*args)
+
+    assert asyncio.run(cache.get_async("result", "a", run_blocking)) == {"score": 1}
+    assert blocking_calls == []
+
+
+def test_disk_reads_go_through_run_blocking(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    writer = FeatureCache(db_path=path)
+    writer.set("result", "a", {"score": 1})
+    writer.flush()
+
+    reader = FeatureCache(db_path=path)
+    blocking_calls = []
+
+    async def run_blocking(func, *args):
+        blocking_calls.append(func)
+        return func(*args)
+
+    assert asyncio.run(reader.get_async("result", "a", run_blocking)) == {"score": 1}
+    assert asyncio.run(reader.get_async("result", "missing", run_blocking)) is None
+    assert len(blocking_calls) == 2
+    assert reader.stats()["namespaces"]["result"] == {"memory_hits": 0, "disk_hits": 1, "misses": 1}
+
+
+def test_queued_writes_are_served_before_they_are_committed(tmp_path):
+    cache = FeatureCache(max_bytes=1, db_path=str(tmp_path / "cache.sqlite"))
+    # Too large for the memory tier, so the value can only come from the disk tier.
+    with cache.disk._lock:
+        cache.set("result", "a", {"score": 1})
+        assert cache.disk._pending
+    assert cache.get("result", "a") == {"score": 1}
+
+    cache.flush()
+    assert not cache.disk._pending
+    assert FeatureCache(db_path=cache.disk.path).get("result", "a") == {"score": 1}
@@ -0,0 +1,90 @@
+import csv
+import os
+
+import numpy as np
+
+from app.audience_classifier import AUDIENCE_LABELS
+from app.cache import content_hash
+from app.feature_store import COLUMNS, FeatureStore, latest_rows, rescore
+from app.final_results import score_posts
+
+
+def make_post(i):
+    return {
+        "clip_similarity": (i % 10) / 10,
+        "sentiment": (i % 7) / 7,
+        "hashtag_similarity": (i % 5) / 5,
+        "hashtag_count": i % 4,
+        "readability": (i % 3) / 3,
+        "faces": i % 2,
+        "dimension_quality": min(1.0, (300 + 100 * i) / 720),
+        "face_detection_failed": i == 3,
+        "width_px": 300 + 100 * i,
+        "height_px": 400,
+        "size": f"{100 + i}.5 KB",
+        "audience_top": AUDIENCE_LABELS[i % len(AUDIENCE_LABELS)] if i % 5 else None,
+        "sequence": f"caption {i}",
+        "hashtags": [],
+    }
+
+
+def make_records(posts, start=0):
+    return [(content_hash("result", start + i), content_hash("image", start + i), post) for i, post in enumerate(posts)]
+
+
+def test_append_reads_back_columns(tmp_path):
+    store = FeatureStore(str(tmp_path))
+    posts = [make_post(i) for i in range(4)]
+    store.append(make_records(posts))
+    store.append(make_records(posts[:1], start=4))
+
+    columns = store.columns()
+    assert store.rows() == 5
+    np.testing.assert_allclose(columns["clip_similarity"], [post["clip_similarity"] for post in posts + posts[:1]])
+    assert columns["audience_top"].tolist()[:2] == [-1, 1]
+    assert columns["size_kb"].tolist()[:2] == [100.5, 101.5]
+
+
+def test_append_drops_rows_of_a_writer_that_died(tmp_path):
+    store = FeatureStore(str(tmp_path))
+    store.append(make_records([make_post(0)]))
+
+    # A writer that died after some columns but before "key" leaves uncommitted bytes behind.
+    with open(os.path.join(str(tmp_path), "clip_similarity.bin"), "ab") as f:
+        f.write(np.asarray([0.99], dtype=COLUMNS["clip_similarity"]).tobytes())
+
+    store.append(make_records([make_post(1)], start=1))
+    columns = store.columns()
+    assert store.rows() == 2
+    np.testing.assert_allclose(columns["clip_similarity"], [0.0, 0.1])
+    for column, dtype in COLUMNS.items():
+        assert os.path.getsize(os.path.join(str(tmp_path), f"{column}.bin")) == 2 * np.dtype(dtype).itemsize
+
+
+def test_latest_rows_keeps_the_last_row_per_key():
+    keys = np.asarray([b"a", b"b", b"a", b"c", b"b"], dtype="S32")
+    assert latest_rows(keys).tolist() == [2, 3, 4]
+
+
+def test_rescore_matches_scoring_the_posts(tmp_path):
+    store = FeatureStore(str(tmp_path / "store"))
+    posts = [make_post(i) for i in range(8)]
+    records = make_records(posts)
+    store.append(records)
+    # Re-analyzed post: only its latest features are re-scored.
+    key, image_hash, _ = records[0]
+    store.append([(key, image_hash, posts[5])])
+
+    out_path = str(tmp_path / "scores.csv")
+    assert rescore(store, out_path=out_path) == len(posts)
+    with open(out_path, encoding="utf-8", newline="") as f:
+        rows = {row["key"]: row for row in csv.DictReader(f)}
+
+    expected = score_posts([posts[5]] + posts[1:])
+    for (key, image_hash, _), result in zip(records, expected):
+        row = rows[key]
+        assert row["image_hash"] == image_hash
+        assert float(row["final_score"]) == result["final_score"]
+        assert (float(row["ci_low"]), float(row["ci_high"])) == result["confidence_interval"]
+        assert row["final_analyse"] == result["final_analyse"]
+        assert row["tips"] == result["tips"]
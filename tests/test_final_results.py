@@ -0,0 +1,87 @@
+import random
+
+import pytest
+
+from app.final_results import (
+    COMPONENTS,
+    confidence_interval,
+    extract_components,
+    final_result,
+    final_result_batch,
+    provisional_result,
+    resolve_weights,
+)
+
+
+def make_item(rng):
+    width, height = rng.choice([(320, 240), (1080, 1080), (640, 900)])
+    image_result = {"image_analysis": {
+        "image_dimension": {"width": f"{width}px", "height": f"{height}px", "size": "1 MB"},
+        "face_detected": rng.randint(0, 3),
+    }}
+    text_result = {"text_analysis": [{
+        "sequence": "caption",
+        "audience": {"adults": rng.random(), "teens": rng.random()},
+        "sentiment": {"label": rng.choice(["positive", "neutral", "negative"]), "score": rng.random()},
+        "readability": {"score": rng.random()},
+    }]}
+    hashtags = [f"#tag{i}" for i in range(rng.randint(0, 5))]
+    clip_result = {"clip_analysis": {
+        "sequence_analysis": {"similarity_normalized": rng.random()},
+        "hashtag_analysis": [{"label": tag, "similarity_normalized": rng.random()} for tag in hashtags],
+    }}
+    return image_result, text_result, clip_result, hashtags
+
+
+def scalar_score(post, weights):
+    components = {name: post[name] for name in COMPONENTS}
+    components["hashtag_count"] = 0.10 if post["hashtag_count"] >= 3 else 0.05 if post["hashtag_count"] >= 1 else 0.0
+    components["faces"] = 1.0 if post["faces"] > 0 else 0.0
+    final_0_1 = 0.0
+    for name in COMPONENTS:
+        final_0_1 += weights[name] * components[name]
+    final_0_1 = max(0.0, min(1.0, final_0_1))
+    ci = confidence_interval(final_0_1, [(components[name], weights[name]) for name in COMPONENTS])
+    return round(final_0_1 * 100.0, 1), ci
+
+
+@pytest.fixture
+def items():
+    rng = random.Random(0)
+    return [make_item(rng) for _ in range(50)]
+
+
+def test_batch_matches_scalar_final_result(items):
+    batch = final_result_batch(items)
+    assert batch == [final_result(*item) for item in items]
+
+
+def test_batch_matches_per_post_formula(items):
+    weights = resolve_weights()
+    for item, result in zip(items, final_result_batch(items)):
+        final_score, ci = scalar_score(extract_components(*item), weights)
+        assert result["final_score"] == final_score
+        assert result["confidence_interval"] == ci
+
+
+def test_provisional_result_without_pending_matches_final_result(items):
+    for item in items:
+        expected = final_result(*item)
+        provisional = provisional_result(extract_components(*item), pending=())
+        assert provisional["final_score"] == expected["final_score"]
+        assert provisional["confidence_interval"] == expected["confidence_interval"]
+        assert provisional["final_analyse"] == expected["final_analyse"]
+        assert provisional["pending"] == []
+
+
+def test_pending_components_score_at_the_prior_and_widen_the_interval(items):
+    post = extract_components(*items[0])
+    nothing_known = provisional_result(post, pending=COMPONENTS)
+    assert nothing_known["final_score"] == 50.0
+
+    widths = []
+    for known in range(len(COMPONENTS) + 1):
+        low, high = provisional_result(post, pending=COMPONENTS[known:])["confidence_interval"]
+        widths.append(high - low)
+    assert widths == sorted(widths, reverse=True)
+    assert widths[0] > widths[-1]
@@ -0,0 +1,45 @@
+import asyncio
+import base64
+
+import pytest
+
+from app.cache import content_hash
+from app.image_loader import ImageLoader, ImageTooLargeError, UnsupportedURLError
+
+
+def data_url(payload):
+    return "data:application/octet-stream;base64," + base64.b64encode(payload).decode()
+
+
+@pytest.mark.parametrize("url", ["file:///etc/hostname", "ftp://example.com/a.jpg", "/etc/hostname"])
+def test_only_http_and_data_urls_are_accepted(url, tmp_path):
+    loader = ImageLoader()
+    with pytest.raises(UnsupportedURLError):
+        asyncio.run(loader.fetch_async(url))
+    with pytest.raises(UnsupportedURLError):
+        asyncio.run(loader.download(url, str(tmp_path / "video"), 1024))
+
+
+def test_data_urls_are_read_off_the_event_loop():
+    loader = ImageLoader()
+    calls = []
+
+    async def run_blocking(func, *args):
+        calls.append(func.__name__)
+        return func(*args)
+
+    data, data_hash = asyncio.run(loader.fetch_async(data_url(b"pixels"), run_blocking=run_blocking))
+    assert bytes(data) == b"pixels"
+    assert data_hash == content_hash(b"pixels")
+    assert calls == ["read_data_url"]
+
+
+def test_data_url_download_matches_the_streamed_hash(tmp_path):
+    loader = ImageLoader()
+    path = tmp_path / "video"
+    video_hash, size = asyncio.run(loader.download(data_url(b"frames" * 100), str(path), 1024))
+    assert (video_hash, size) == (content_hash(b"frames" * 100), 600)
+    assert path.read_bytes() == b"frames" * 100
+
+    with pytest.raises(ImageTooLargeError):
+        asyncio.run(loader.download(data_url(b"frames" * 100), str(path), 100))
@@ -0,0 +1,30 @@
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("optimum.onnxruntime")
+
+from app.inference_backend import parity
+from benchmarks.stub_models import build_stub_models
+
+MODEL_VARIABLES = {
+    "zero_shot": "ZERO_SHOT_MODEL",
+    "sentiment": "SENTIMENT_MODEL",
+    "keyphrase": "KEYPHRASE_MODEL",
+    "clip": "CLIP_MODEL",
+}
+
+
+@pytest.mark.parametrize("quantize", ["0", "1"])
+def test_onnx_backend_matches_torch(quantize, tmp_path_factory, monkeypatch):
+    models = build_stub_models(str(tmp_path_factory.getbasetemp() / "stub_models"))
+    for key, variable in MODEL_VARIABLES.items():
+        monkeypatch.setenv(variable, models[key])
+    monkeypatch.setenv("ONNX_CACHE_DIR", str(tmp_path_factory.mktemp("onnx")))
+    monkeypatch.setenv("ONNX_QUANTIZE", quantize)
+    monkeypatch.setenv("MODEL_SNAPSHOT_DIR", "")
+
+    report = parity(tolerance=0.05)
+
+    assert report["quantized"] == (quantize == "1")
+    assert set(report["max_abs_drift"]) == set(MODEL_VARIABLES)
+    assert report["passed"], report["max_abs_drift"]
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from app import sessions
+from app.sessions import EditSession, SessionStore
+
+
+def make_store(debounce=0.2, idle_seconds=600, max_sessions=1000):
+    store = SessionStore()
+    store.debounce = debounce
+    store.idle_seconds = idle_seconds
+    store.max_sessions = max_sessions
+    return store
+
+
+def test_edits_within_the_debounce_share_the_newest_result():
+    store = make_store()
+    session = store.add(EditSession(None, {}))
+    scored = []
+
+    async def score(session, text):
+        scored.append(text)
+        return len(text)
+
+    async def typing():
+        edits = []
+        for text in ("h", "he", "hey"):
+            edits.append(asyncio.create_task(store.edit(session, text, score)))
+            await asyncio.sleep(0.01)
+        return await asyncio.gather(*edits)
+
+    results = asyncio.run(typing())
+    assert scored == ["hey"]
+    assert results == [{"text": "hey", "result": 3}] * 3
+
+
+def test_edits_after_a_quiet_period_are_scored_again():
+    store = make_store(debounce=0.01)
+    session = store.add(EditSession(None, {}))
+    scored = []
+
+    async def score(session, text):
+        scored.append(text)
+        return text.upper()
+
+    async def typing():
+        first = await store.edit(session, "one", score)
+        second = await store.edit(session, "two", score)
+        return first, second
+
+    assert asyncio.run(typing()) == ({"text": "one", "result": "ONE"}, {"text": "two", "result": "TWO"})
+    assert scored == ["one", "two"]
+
+
+def test_a_failed_score_fails_the_coalesced_edits_too():
+    store = make_store()
+    session = store.add(EditSession(None, {}))
+
+    async def score(session, text):
+        raise ValueError(f"cannot score {text}")
+
+    async def typing():
+        first = asyncio.create_task(store.edit(session, "a", score))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(store.edit(session, "ab", score))
+        return await asyncio.gather(first, second, return_exceptions=True)
+
+    first, second = asyncio.run(typing())
+    assert isinstance(first, ValueError) and str(first) == "cannot score ab"
+    assert first is second
+    assert session.pending is None
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(sessions.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_idle_sessions_expire(clock):
+    store = make_store(idle_seconds=60)
+    idle = store.add(EditSession(None, {}))
+    active = store.add(EditSession(None, {}))
+
+    clock[0] += 45
+    assert store.get(active.id) is active
+    clock[0] += 30
+    assert store.get(idle.id) is None
+    assert store.get(active.id) is active
+
+
+def test_least_recently_used_session_is_evicted_over_the_limit(clock):
+    store = make_store(max_sessions=2)
+    first = store.add(EditSession(None, {}))
+    second = store.add(EditSession(None, {}))
+    assert store.get(first.id) is first
+
+    store.add(EditSession(None, {}))
+    assert store.get(second.id) is None
+    assert store.get(first.id) is first
+    assert store.remove(first.id)
+    assert not store.remove(first.id)
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from app.singleflight import SingleFlight
+
+
+def test_concurrent_calls_with_the_same_key_share_one_execution():
+    flight = SingleFlight("test-shared")
+    calls = []
+
+    async def work(value):
+        calls.append(value)
+        await asyncio.sleep(0.05)
+        return {"value": value}
+
+    async def run():
+        return await asyncio.gather(
+            flight.do("a", work, 1), flight.do("a", work, 1), flight.do("a", work, 1), flight.do("b", work, 2)
+        )
+
+    results = asyncio.run(run())
+    assert calls == [1, 2]
+    assert results[:3] == [{"value": 1}] * 3 and results[3] == {"value": 2}
+    assert flight.stats()["executed"] == 2
+    assert flight.stats()["shared"] == 2
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_nothing_is_kept_once_a_call_finishes():
+    flight = SingleFlight("test-sequential")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        return len(calls)
+
+    async def run():
+        return [await flight.do("a", work), await flight.do("a", work)]
+
+    assert asyncio.run(run()) == [1, 2]
+
+
+def test_an_exception_reaches_every_caller():
+    flight = SingleFlight("test-error")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        raise ValueError("download failed")
+
+    async def run():
+        return await asyncio.gather(flight.do("a", work), flight.do("a", work), return_exceptions=True)
+
+    first, second = asyncio.run(run())
+    assert len(calls) == 1
+    assert isinstance(first, ValueError) and first is second
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_a_cancelled_caller_does_not_cancel_the_others():
+    flight = SingleFlight("test-cancel")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run():
+        leaving = asyncio.create_task(flight.do("a", work))
+        staying = asyncio.create_task(flight.do("a", work))
+        await asyncio.sleep(0.01)
+        leaving.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+        return await staying
+
+    assert asyncio.run(run()) == "done"
+    assert len(calls) == 1
+
+
+def test_disabled_flight_runs_every_call(monkeypatch):
+    monkeypatch.setenv("SINGLE_FLIGHT", "0")
+    flight = SingleFlight("test-disabled")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+
+    async def run():
+        await asyncio.gather(flight.do("a", work), flight.do("a", work))
+
+    asyncio.run(run())
+    assert len(calls) == 2